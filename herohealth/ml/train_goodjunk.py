@@ -1,8 +1,12 @@
 # === /webxr-health-mobile/herohealth/ml/train_goodjunk.py ===
 # Train baseline risk model from goodjunk dataset CSV
 # v20260302-TRAIN
+import os
+import glob
 import json
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
 from sklearn.model_selection import train_test_split
@@ -15,17 +19,54 @@ FEATURES = [
 ]
 LABEL = "y_errorSoon"
 
+def expand_csv_inputs(specs):
+    # files, globs, or directories (-> *.csv inside); sorted, de-duplicated, order kept
+    paths = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            found = sorted(glob.glob(os.path.join(spec, "*.csv")))
+        elif glob.has_magic(spec):
+            found = sorted(glob.glob(spec))
+        else:
+            found = [spec]
+        for p in found:
+            if p not in paths:
+                paths.append(p)
+    return paths
+
+def read_one(path):
+    # only FEATURES + LABEL, parsed straight to float32 (label too: it may have blanks)
+    cols = FEATURES + [LABEL]
+    df = pd.read_csv(path, usecols=lambda c: c in cols, dtype={c: np.float32 for c in cols})
+    missing = [c for c in cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"{path}: missing columns {missing}")
+    df = df.dropna(subset=cols)
+    return df[FEATURES].to_numpy(dtype=np.float32), df[LABEL].to_numpy().astype(np.int8)
+
+def load_xy(paths, workers=None):
+    # one file per task; blocks stacked in input order
+    if len(paths) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(read_one, paths))
+    else:
+        parts = [read_one(p) for p in paths]
+    X = np.concatenate([p[0] for p in parts]) if parts else np.zeros((0, len(FEATURES)), dtype=np.float32)
+    y = np.concatenate([p[1] for p in parts]) if parts else np.zeros(0, dtype=np.int8)
+    return X, y
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--csv", required=True, help="Path to goodjunk-dataset.csv")
+    ap.add_argument("--csv", required=True, nargs="+", help="goodjunk-dataset CSV files, globs, or directories")
     ap.add_argument("--out", default="goodjunk_weights.json", help="Output weights json")
+    ap.add_argument("--workers", type=int, default=None, help="processes for reading CSVs (default: all cores)")
     args = ap.parse_args()
 
-    df = pd.read_csv(args.csv)
-    df = df.dropna(subset=FEATURES + [LABEL]).copy()
-
-    X = df[FEATURES].astype(float).values
-    y = df[LABEL].astype(int).values
+    paths = expand_csv_inputs(args.csv)
+    if not paths:
+        raise SystemExit(f"No CSV files match: {' '.join(args.csv)}")
+    X, y = load_xy(paths, workers=args.workers)
+    print(f"Loaded {len(X)} rows from {len(paths)} file(s)")
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
 
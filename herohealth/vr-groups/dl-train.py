@@ -7,8 +7,13 @@
 # Input: groups.csv (from GroupsVR.AIHooks.toCSV())
 # Output: model.keras
 
+import os
+import json
+import shutil
+import hashlib
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from pathlib import Path
 
 from tensorflow import keras
@@ -20,6 +25,17 @@ H_MISS = 5
 H_SCORE = 5
 H_MINI  = 10
 TEST_SPLIT = 0.2
+VAL_SPLIT = 0.2
+BATCH = 64
+
+# "sequence": windows gathered per batch from the per-tick feature matrix (memory ~ ticks)
+# "arrays":   materialize every (SEQ, F) window up front (memory ~ SEQ x ticks)
+INPUT_PIPELINE = "sequence"
+
+# built window arrays are cached per (CSV content, SEQ, horizons, FEAT_KEYS); reruns skip the CSV
+USE_CACHE = True
+CACHE_DIR = Path(".dlcache")
+CACHE_VERSION = 1   # bump when build_features / build_labels change
 
 FEAT_KEYS = [
     "acc", "missN", "comboN", "pressure",
@@ -111,55 +127,141 @@ def build_labels(df):
     valid = (~misses_f.isna()) & (~score_f.isna())
     return y1[valid].values, y2[valid], y3[valid].values, valid.values
 
+def gather_windows(Xv, order, starts):
+    # rows regrouped by seed once, then every window is a sliding_window_view slice
+    # starting at a per-seed offset (windows never cross seeds)
+    Xg = np.ascontiguousarray(Xv[order], dtype=np.float32)
+    wins = sliding_window_view(Xg, SEQ, axis=0).transpose(0, 2, 1)   # (rows-SEQ+1, SEQ, F) view
+    return wins[starts]
+
 def build_sequences(df, X, y1, y2, y3, valid_mask):
-    # apply valid_mask first
-    dfv = df[valid_mask].copy().reset_index(drop=True)
-    Xv  = X[valid_mask]
-    y1v = y1
-    y2v = y2[valid_mask]
-    y3v = y3
-
-    seeds = dfv["seed"].astype(str).values
-    idx_by_seed = {}
-    for i,s in enumerate(seeds):
-        idx_by_seed.setdefault(s, []).append(i)
-
-    Xs, Y1, Y2, Y3 = [], [], [], []
-    for s, idxs in idx_by_seed.items():
-        for j in range(SEQ-1, len(idxs)):
-            win = idxs[j-SEQ+1:j+1]
-            Xs.append(Xv[win])
-            Y1.append(y1v[idxs[j]])
-            Y2.append(y2v[idxs[j]])
-            Y3.append(y3v[idxs[j]])
-
-    return (
-        np.array(Xs, dtype=np.float32),
-        np.array(Y1, dtype=np.float32),
-        np.array(Y2, dtype=np.float32),
-        np.array(Y3, dtype=np.float32),
-    )
+    Xv, order, starts, ys = build_window_dataset(df, X, y1, y2, y3, valid_mask)
+    if len(starts) == 0:
+        empty = np.array([], dtype=np.float32)
+        return empty, empty.copy(), empty.copy(), empty.copy()
+    return gather_windows(Xv, order, starts), ys["miss_spike"], ys["mini_fail"], ys["score_drop"]
+
+def window_index(seeds):
+    """
+    Window layout without copying features.
+    order:  row positions grouped by seed (first-seen order, rows kept in order)
+    starts: one entry per window; the window's rows are order[start : start+SEQ]
+    Windows come out in the same order as build_sequences.
+    """
+    codes, _ = pd.factorize(pd.Series(seeds).astype(str))
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes) if len(codes) else np.zeros(0, dtype=np.int64)
+    seg_start = np.cumsum(counts) - counts
+    n_win = np.maximum(counts - SEQ + 1, 0)
+    first = np.cumsum(n_win) - n_win
+    starts = np.repeat(seg_start - first, n_win) + np.arange(int(n_win.sum()))
+    return order, starts
+
+class WindowSequence(keras.utils.Sequence):
+    # shuffled batches of SEQ-step windows, gathered from Xv by index
+    def __init__(self, Xv, order, starts, ys, ids, batch_size=BATCH, shuffle=True, seed=42, **kwargs):
+        super().__init__(**kwargs)
+        self.Xv = Xv
+        self.order = order
+        self.starts = starts
+        self.ys = ys
+        self.ids = np.asarray(ids)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.offsets = np.arange(SEQ)
+        self.on_epoch_end()
+
+    def __len__(self):
+        return (len(self.ids) + self.batch_size - 1) // self.batch_size
+
+    def __getitem__(self, i):
+        sel = self.perm[i * self.batch_size:(i + 1) * self.batch_size]
+        rows = self.order[self.starts[sel][:, None] + self.offsets]
+        return self.Xv[rows], {k: v[sel] for k, v in self.ys.items()}
+
+    def on_epoch_end(self):
+        self.perm = self.rng.permutation(self.ids) if self.shuffle else self.ids
+
+def build_window_dataset(df, X, y1, y2, y3, valid_mask):
+    # same windows/labels as build_sequences, but features stay (ticks, F)
+    Xv = np.ascontiguousarray(X[valid_mask], dtype=np.float32)
+    order, starts = window_index(df["seed"].values[valid_mask])
+    last = order[starts + SEQ - 1]
+    ys = {
+        "miss_spike": np.asarray(y1, dtype=np.float32)[last],
+        "mini_fail": np.asarray(y2, dtype=np.float32)[last],
+        "score_drop": np.asarray(y3, dtype=np.float32)[last],
+    }
+    return Xv, order, starts, ys
+
+CACHE_ARRAYS = ["Xv", "order", "starts", "miss_spike", "mini_fail", "score_drop"]
+
+def cache_key(csv_path):
+    h = hashlib.sha256()
+    with open(csv_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    params = {"csv_sha256": h.hexdigest(), "SEQ": SEQ, "H_MISS": H_MISS, "H_SCORE": H_SCORE,
+              "H_MINI": H_MINI, "FEAT_KEYS": FEAT_KEYS, "version": CACHE_VERSION}
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:24], params
+
+def load_window_dataset():
+    # (Xv, order, starts, ys) from the cache as read-only memmaps, or built from CSV_PATH and cached
+    key, params = cache_key(CSV_PATH) if USE_CACHE else (None, None)
+    d = CACHE_DIR / key if USE_CACHE else None
+    if USE_CACHE and (d / "meta.json").exists():
+        print("Cache hit:", d)
+        arr = {k: np.load(d / f"{k}.npy", mmap_mode="r") for k in CACHE_ARRAYS}
+        ys = {k: arr[k] for k in ["miss_spike", "mini_fail", "score_drop"]}
+        return arr["Xv"], arr["order"], arr["starts"], ys
 
-def main():
     df = load_csv()
     X = build_features(df)
     y1, y2, y3, valid = build_labels(df)
-    Xseq, Y1, Y2, Y3 = build_sequences(df, X, y1, y2, y3, valid)
-
-    if len(Xseq) < 400:
-        raise SystemExit(f"ข้อมูลยังน้อย: sequences={len(Xseq)} (แนะนำเล่นเก็บเพิ่ม)")
+    Xv, order, starts, ys = build_window_dataset(df, X, y1, y2, y3, valid)
+
+    if USE_CACHE:
+        # write into a temp dir, meta.json last, then rename into place
+        tmp = CACHE_DIR / f"{key}.tmp{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for k, v in {"Xv": Xv, "order": order, "starts": starts, **ys}.items():
+            np.save(tmp / f"{k}.npy", np.ascontiguousarray(v))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({**params, "csv": str(CSV_PATH), "ticks": int(len(Xv)), "windows": int(len(starts))}, f, indent=2)
+        shutil.rmtree(d, ignore_errors=True)
+        os.replace(tmp, d)
+        print("Cached:", d)
+    return Xv, order, starts, ys
 
-    rng = np.random.default_rng(42)
-    p = rng.permutation(len(Xseq))
-    Xseq, Y1, Y2, Y3 = Xseq[p], Y1[p], Y2[p], Y3[p]
+def main():
+    Xv, order, starts, ys = load_window_dataset()
+    n_seq, n_feat = len(starts), Xv.shape[-1]
 
-    n_test = int(len(Xseq)*TEST_SPLIT)
-    X_test, X_train = Xseq[:n_test], Xseq[n_test:]
-    y1_test, y1_train = Y1[:n_test], Y1[n_test:]
-    y2_test, y2_train = Y2[:n_test], Y2[n_test:]
-    y3_test, y3_train = Y3[:n_test], Y3[n_test:]
+    if n_seq < 400:
+        raise SystemExit(f"ข้อมูลยังน้อย: sequences={n_seq} (แนะนำเล่นเก็บเพิ่ม)")
 
-    inp = layers.Input(shape=(SEQ, Xseq.shape[-1]))
+    rng = np.random.default_rng(42)
+    p = rng.permutation(n_seq)
+    n_test = int(n_seq*TEST_SPLIT)
+
+    if INPUT_PIPELINE == "sequence":
+        # same split as the arrays path: test = p[:n_test], val = last VAL_SPLIT of the rest
+        train_ids = p[n_test:]
+        split_at = int(len(train_ids) * (1 - VAL_SPLIT))
+        train_seq = WindowSequence(Xv, order, starts, ys, train_ids[:split_at])
+        val_seq = WindowSequence(Xv, order, starts, ys, train_ids[split_at:], shuffle=False)
+        test_seq = WindowSequence(Xv, order, starts, ys, p[:n_test], shuffle=False)
+    else:
+        Xseq = gather_windows(Xv, order, starts[p])
+        Y1, Y2, Y3 = ys["miss_spike"][p], ys["mini_fail"][p], ys["score_drop"][p]
+        X_test, X_train = Xseq[:n_test], Xseq[n_test:]
+        y1_test, y1_train = Y1[:n_test], Y1[n_test:]
+        y2_test, y2_train = Y2[:n_test], Y2[n_test:]
+        y3_test, y3_train = Y3[:n_test], Y3[n_test:]
+
+    inp = layers.Input(shape=(SEQ, n_feat))
     x = layers.GRU(48)(inp)
     x = layers.Dropout(0.25)(x)
     x = layers.Dense(24, activation="relu")(x)
@@ -189,21 +291,25 @@ def main():
         keras.callbacks.ReduceLROnPlateau(patience=2, factor=0.5)
     ]
 
-    model.fit(
-        X_train,
-        {"miss_spike": y1_train, "mini_fail": y2_train, "score_drop": y3_train},
-        validation_split=0.2,
-        epochs=35,
-        batch_size=64,
-        callbacks=cb,
-        verbose=2
-    )
-
-    print("EVAL:", model.evaluate(
-        X_test,
-        {"miss_spike": y1_test, "mini_fail": y2_test, "score_drop": y3_test},
-        verbose=0
-    ))
+    if INPUT_PIPELINE == "sequence":
+        model.fit(train_seq, validation_data=val_seq, epochs=35, callbacks=cb, verbose=2)
+        print("EVAL:", model.evaluate(test_seq, verbose=0))
+    else:
+        model.fit(
+            X_train,
+            {"miss_spike": y1_train, "mini_fail": y2_train, "score_drop": y3_train},
+            validation_split=VAL_SPLIT,
+            epochs=35,
+            batch_size=BATCH,
+            callbacks=cb,
+            verbose=2
+        )
+
+        print("EVAL:", model.evaluate(
+            X_test,
+            {"miss_spike": y1_test, "mini_fail": y2_test, "score_drop": y3_test},
+            verbose=0
+        ))
 
     model.save("model.keras")
     print("Saved: model.keras")
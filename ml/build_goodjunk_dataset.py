@@ -1,10 +1,16 @@
 # === /webxr-health-mobile/ml/build_goodjunk_dataset.py ===
 # Build DL dataset from GoodJunk events CSV (Google Sheet export)
-# Output: artifacts/goodjunk_seq_dataset.npz
+# Output: artifacts/goodjunk_seq_dataset.npz  (or --format npy -> artifacts/goodjunk_seq_dataset/)
 
+import argparse
+import hashlib
+import json
+import shutil
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 ROOT = Path(__file__).resolve().parent
 DATA = ROOT / "data"
@@ -13,107 +19,645 @@ ART.mkdir(parents=True, exist_ok=True)
 
 # -------- config --------
 WINDOW_EVENTS = 20     # W
-HORIZON_SEC   = 4.0    # H seconds ahead
+HORIZON_SEC   = 4.0    # H seconds ahead (default; --horizons 2,4,8 labels several in one pass)
 
-def main():
-    ev_path = DATA / "goodjunk_events.csv"
-    if not ev_path.exists():
-        raise SystemExit(f"Missing {ev_path}. Export events tab as CSV -> put here.")
+# error codes (= y_next classes)
+ERR_NONE        = 0
+ERR_JUNK_HIT    = 1
+ERR_GOOD_EXPIRE = 2
+
+def _lower(df, col):
+    if not col:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].fillna("").astype(str).str.lower()
+
+def classify_errors(df, c_name, c_ttype):
+    # columnar miss rule -> int8 code per event
+    # - "expire" + good (name or target_type)          -> good_expire
+    # - hit/touch/click + junk (name or target_type)    -> junk_hit
+    n = _lower(df, c_name)
+    t = _lower(df, c_ttype)
+    has = lambda s: n.str.contains(s, regex=False).values
+    t_good = (t == "good").values
+    t_junk = (t == "junk").values
+
+    expire = has("expire") & (has("good") | t_good)
+    hit = (has("hit") | has("touch") | has("click")) & (has("junk") | t_junk)
+
+    err = np.full(len(df), ERR_NONE, dtype=np.int8)
+    err[hit] = ERR_JUNK_HIT
+    err[expire] = ERR_GOOD_EXPIRE   # expire rule wins (checked first before)
+    return err
+
+def session_bounds(sids):
+    # sids must be grouped (sorted); returns [start, end) per session
+    n = len(sids)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    cut = np.flatnonzero(sids[1:] != sids[:-1]) + 1
+    return np.r_[0, cut].astype(np.int64), np.r_[cut, n].astype(np.int64)
 
-    df = pd.read_csv(ev_path)
+def next_error_index(err, s_start, s_end):
+    # for each event i: index of the first error event > i in the same session, else -1
+    n = len(err)
+    err_pos = np.flatnonzero(err != ERR_NONE)
+    k = np.searchsorted(err_pos, np.arange(n), side="right")
+    nxt = np.full(n, -1, dtype=np.int64)
+    ok = k < len(err_pos)
+    cand = err_pos[k[ok]]
+    sess_end = np.repeat(s_end, s_end - s_start)
+    hit = cand < sess_end[ok]
+    nxt[np.flatnonzero(ok)[hit]] = cand[hit]
+    return nxt
 
+def window_starts(s_start, s_end, window):
+    # window i covers [i, i+W) and needs >=1 event after it (same session)
+    counts = np.maximum(s_end - s_start - window, 0)
+    total = int(counts.sum())
+    first = np.repeat(s_start, counts)
+    base = np.repeat(np.cumsum(counts) - counts, counts)
+    return first + (np.arange(total, dtype=np.int64) - base)
+
+def label_windows(times, err, nxt, w_last, horizon_sec):
+    # risk = first error after the window's last event lands within the horizon
+    # horizon_sec: float -> (N,) labels; list of H floats -> (N, H), one column per horizon
+    h_ms = (np.atleast_1d(np.asarray(horizon_sec, dtype=np.float64)) * 1000).astype(np.int64)
+    j = nxt[w_last]
+    has = j >= 0
+    tj = np.where(has, times[np.maximum(j, 0)], 0)
+    risk = has[:, None] & (tj[:, None] <= times[w_last][:, None] + h_ms[None, :])
+    y_next = np.where(risk, err[np.maximum(j, 0)][:, None], ERR_NONE)
+    if np.ndim(horizon_sec) == 0:
+        risk, y_next = risk[:, 0], y_next[:, 0]
+    return risk.astype(np.int64), y_next.astype(np.int64)
+
+def window_view(feats, window):
+    # (n, F) event features -> (n-W+1, W, F) strided view (no copy); row i = events [i, i+W)
+    if len(feats) < window:
+        return np.zeros((0, window, feats.shape[1]), dtype=feats.dtype)
+    return sliding_window_view(feats, window, axis=0).transpose(0, 2, 1)
+
+def pick_columns(columns):
     # Map columns (adjust if your sheet headers differ)
     # We assume your client sends:
     # - session_id, ts_ms, event_name/event_type, target_type, rt_ms, miss, accuracy_pct, totalScore (packed)
     def pick(*names):
         for n in names:
-            if n in df.columns:
+            if n in columns:
                 return n
         return None
 
-    c_sid = pick("session_id","sessionId")
-    c_ts  = pick("ts_ms","timestampMs","timestamp")
-    c_name= pick("event_name","eventName")
-    c_type= pick("event_type","eventType")
-    c_ttype=pick("target_type","itemType","targetType")
-    c_rt  = pick("rt_ms","rtMs")
+    cols = {
+        "sid":   pick("session_id","sessionId"),
+        "ts":    pick("ts_ms","timestampMs","timestamp"),
+        "name":  pick("event_name","eventName"),
+        "type":  pick("event_type","eventType"),
+        "ttype": pick("target_type","itemType","targetType"),
+        "rt":    pick("rt_ms","rtMs"),
+    }
+    if not all([cols["sid"], cols["ts"]]):
+        raise SystemExit(f"Need session+time columns. Have: {list(columns)[:40]}")
+    return cols
 
-    if not all([c_sid, c_ts]):
-        raise SystemExit(f"Need session+time columns. Have: {list(df.columns)[:40]}")
+FEAT_COLS = ["tt_good","tt_junk","rt"]
 
-    df[c_ts] = pd.to_numeric(df[c_ts], errors="coerce").fillna(0).astype(np.int64)
-    df[c_sid] = df[c_sid].astype(str)
+def prepare_events(df, cols):
+    # raw sheet rows -> sid, ts, err_code + FEAT_COLS (row order kept)
+    c_sid, c_ts, c_ttype, c_rt = cols["sid"], cols["ts"], cols["ttype"], cols["rt"]
+    ev = pd.DataFrame(index=df.index)
+    ev["sid"] = df[c_sid].astype(str)
+    ev["ts"] = pd.to_numeric(df[c_ts], errors="coerce").fillna(0).astype(np.int64)
 
     # define "error events" (ตามนิยาม miss)
     # - junk hit  OR good expired
-    def is_error(row):
-        n = str(row.get(c_name, "")).lower()
-        t = str(row.get(c_ttype, "")).lower()
-        # accept multiple naming styles
-        if "expire" in n and ("good" in n or t=="good"):
-            return "good_expire"
-        if ("hit" in n or "touch" in n or "click" in n) and ("junk" in n or t=="junk"):
-            return "junk_hit"
-        return "none"
-
-    df["err_type"] = df.apply(is_error, axis=1)
+    ev["err_code"] = classify_errors(df, cols["name"], c_ttype)
 
     # Features per event (simple, expandable)
     # You can add: score_delta, combo, fever, shield, x/y, etc.
-    feat_cols = []
     # one-hot target_type (good/junk/other)
-    df["tt_good"] = (df[c_ttype].astype(str).str.lower() == "good").astype(np.float32) if c_ttype else 0.0
-    df["tt_junk"] = (df[c_ttype].astype(str).str.lower() == "junk").astype(np.float32) if c_ttype else 0.0
-    df["rt"] = pd.to_numeric(df[c_rt], errors="coerce").fillna(0).astype(np.float32) if c_rt else 0.0
+    ev["tt_good"] = (df[c_ttype].astype(str).str.lower() == "good").astype(np.float32) if c_ttype else 0.0
+    ev["tt_junk"] = (df[c_ttype].astype(str).str.lower() == "junk").astype(np.float32) if c_ttype else 0.0
+    ev["rt"] = pd.to_numeric(df[c_rt], errors="coerce").fillna(0).astype(np.float32) if c_rt else 0.0
+    return ev
+
+def npy_append(path, arr):
+    # append rows (axis 0) to an existing .npy; numpy pads the header so shape[0] can grow in place
+    fmt = np.lib.format
+    arr = np.ascontiguousarray(arr)
+    with open(path, "r+b") as f:
+        version = fmt.read_magic(f)
+        read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+        shape, fortran, dtype = read_header(f)
+        hdr_len = f.tell()
+        if fortran or dtype != arr.dtype or tuple(shape[1:]) != arr.shape[1:]:
+            raise ValueError(f"Cannot append {arr.dtype}{arr.shape} to {path} ({dtype}{shape})")
+        f.seek(0)
+        d = {"descr": fmt.dtype_to_descr(dtype), "fortran_order": False,
+             "shape": (shape[0] + arr.shape[0],) + tuple(shape[1:])}
+        if version == (1, 0):
+            fmt.write_array_header_1_0(f, d)
+        else:
+            fmt.write_array_header_2_0(f, d)
+        if f.tell() != hdr_len:
+            raise ValueError(f"npy header of {path} cannot grow in place")
+        f.seek(0, 2)
+        f.write(arr.tobytes())
+
+LAYOUTS = ("windows", "index")
+
+def array_specs(horizon, layout="windows"):
+    # name -> (dtype, per-row shape); labels get one column per horizon when given a list
+    # layout "windows": X = materialized (N, W, F) windows
+    # layout "index":   events (n_events, F) + ev_offsets (session run starts) + w_start (N,);
+    #                   window i = events[w_start[i] : w_start[i] + W]  (see WindowSampler)
+    y_shape = () if np.ndim(horizon) == 0 else (len(horizon),)
+    if layout == "index":
+        specs = {
+            "events":     (np.float32, (len(FEAT_COLS),)),
+            "ev_offsets": (np.int64, ()),
+            "w_start":    (np.int64, ()),
+        }
+    else:
+        specs = {"X": (np.float32, (WINDOW_EVENTS, len(FEAT_COLS)))}
+    specs["y_risk"] = (np.int64, y_shape)
+    specs["y_next"] = (np.int64, y_shape)
+    return specs
+
+def write_manifest(out, n, horizon, layout, stale_rows=()):
+    arrays = {}
+    for k, (dt, shape) in array_specs(horizon, layout).items():
+        arrays[k] = {"dtype": np.dtype(dt).name, "shape": list(np.load(out / f"{k}.npy", mmap_mode="r").shape)}
+    meta = {
+        "format": "goodjunk-seq-npy-v1",
+        "layout": layout,
+        "window_events": WINDOW_EVENTS,
+        "horizon_sec": horizon,
+        "feat_cols": FEAT_COLS,
+        "n_samples": int(n),
+        # [start, stop) sample ranges superseded by an incremental rebuild
+        "stale_rows": [[int(a), int(b)] for a, b in stale_rows],
+        "arrays": arrays,
+    }
+    with open(out / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+class DatasetWriter:
+    # Appends built blocks to one .npy per array in one directory.
+    # fmt="npy": that directory is the dataset (+ manifest.json)
+    # fmt="npz": it is scratch space, streamed into one compressed .npz on close
+    # resume=True (npy only): keep the existing arrays and append after them
+    def __init__(self, out, fmt="npz", horizon=HORIZON_SEC, layout="windows", resume=False):
+        self.out = Path(out)
+        self.fmt = fmt
+        self.horizon = horizon
+        self.layout = layout
+        self.arrays = array_specs(horizon, layout)
+        self.dir = self.out if fmt == "npy" else self.out.parent / (self.out.stem + ".spill")
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.n = 0
+        self.n_events = 0
+        self.stale_rows = []
+        if resume:
+            self._resume()
+            return
+        for f in ("X", "events", "ev_offsets", "w_start"):
+            (self.dir / f"{f}.npy").unlink(missing_ok=True)
+        for k, (dt, shape) in self.arrays.items():
+            np.save(self.dir / f"{k}.npy", np.zeros((0, *shape), dtype=dt))
+        (self.dir / "sessions.json").unlink(missing_ok=True)
 
-    feat_cols = ["tt_good","tt_junk","rt"]
+    def _resume(self):
+        with open(self.dir / "manifest.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        built = (meta["window_events"], meta["horizon_sec"], meta["feat_cols"], meta.get("layout", "windows"))
+        if built != (WINDOW_EVENTS, self.horizon, FEAT_COLS, self.layout):
+            raise SystemExit(f"{self.dir} was built with other window/horizon/features/layout; rebuild without --incremental")
+        self.n = int(meta["n_samples"])
+        self.stale_rows = [tuple(r) for r in meta.get("stale_rows", [])]
+        for k in self.arrays:
+            if list(np.load(self.dir / f"{k}.npy", mmap_mode="r").shape) != meta["arrays"][k]["shape"]:
+                raise SystemExit(f"{self.dir}/{k}.npy does not match manifest.json (interrupted build?); rebuild without --incremental")
+        if self.layout == "index":
+            self.n_events = meta["arrays"]["events"]["shape"][0]
+
+    def _append(self, **cols):
+        for k, v in cols.items():
+            npy_append(self.dir / f"{k}.npy", np.asarray(v, dtype=self.arrays[k][0]))
+
+    def add(self, feats, w_start, y_risk, y_next, s_start=(0,), batch=65536):
+        # feats: contiguous (n, F) events of whole session runs starting at s_start;
+        # w_start: window starts into feats; labels per window
+        w_start = np.asarray(w_start, dtype=np.int64)
+        if self.layout == "index":
+            base = self.n_events
+            self._append(events=feats, ev_offsets=base + np.asarray(s_start, dtype=np.int64),
+                         w_start=base + w_start, y_risk=y_risk, y_next=y_next)
+            self.n_events += len(feats)
+        else:
+            # gather strided views a batch at a time; only the written batch is materialized
+            windows = window_view(feats, WINDOW_EVENTS)
+            for a in range(0, len(w_start), batch):
+                self._append(X=windows[w_start[a:a+batch]], y_risk=y_risk[a:a+batch], y_next=y_next[a:a+batch])
+        self.n += len(w_start)
+
+    def close(self):
+        if self.fmt == "npy":
+            write_manifest(self.dir, self.n, self.horizon, self.layout, self.stale_rows)
+            return
+        try:
+            arr = {k: np.load(self.dir / f"{k}.npy", mmap_mode="r") for k in self.arrays}
+            # memmaps: savez streams them through in buffered chunks
+            np.savez_compressed(self.out, **arr, layout=self.layout,
+                                window_events=WINDOW_EVENTS, horizon_sec=np.asarray(self.horizon),
+                                feat_cols=np.array(FEAT_COLS, dtype=object))
+            del arr
+        finally:
+            shutil.rmtree(self.dir)
+
+def load_dataset(path):
+    # npy dataset dir -> read-only np.memmap views (pages in lazily); .npz -> loaded arrays
+    path = Path(path)
+    if path.is_dir():
+        with open(path / "manifest.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        data = {k: np.load(path / f"{k}.npy", mmap_mode="r") for k in meta["arrays"]}
+        data.update(layout=meta.get("layout", "windows"), window_events=meta["window_events"],
+                    horizon_sec=meta["horizon_sec"], feat_cols=list(meta["feat_cols"]))
+        if meta.get("stale_rows"):
+            # incremental rebuilds leave superseded rows in place: index arrays with data["rows"]
+            live = np.ones(meta["n_samples"], dtype=bool)
+            for a, b in meta["stale_rows"]:
+                live[a:b] = False
+            data["rows"] = np.flatnonzero(live)
+        return data
+    with np.load(path, allow_pickle=True) as z:
+        data = {k: z[k] for k in z.files}
+    data["layout"] = str(data["layout"]) if "layout" in data else "windows"
+    data["window_events"] = int(data["window_events"])
+    data["horizon_sec"] = data["horizon_sec"].tolist()
+    data["feat_cols"] = [str(c) for c in data["feat_cols"]]
+    return data
+
+class WindowSampler:
+    # Batches (X, y_risk, y_next) from either layout; "index" datasets assemble X on the fly
+    # from the strided event view, so only batch_size windows exist in memory at a time.
+    def __init__(self, data, batch_size=256, shuffle=True, seed=42):
+        self.data = data
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.rows = data.get("rows")
+        if self.rows is None:
+            self.rows = np.arange(len(data["y_risk"]))
+        if data["layout"] == "index":
+            self.windows = window_view(data["events"], data["window_events"])
+            self.w_start = data["w_start"]
+        else:
+            self.windows = data["X"]
+            self.w_start = None
+
+    def __len__(self):
+        return (len(self.rows) + self.batch_size - 1) // self.batch_size
+
+    def batch(self, idx):
+        # idx: sample indices; sorted so memmap reads go forward
+        idx = np.sort(idx)
+        src = self.w_start[idx] if self.w_start is not None else idx
+        return (np.ascontiguousarray(self.windows[src]),
+                np.asarray(self.data["y_risk"][idx]), np.asarray(self.data["y_next"][idx]))
+
+    def __iter__(self):
+        rows = self.rng.permutation(self.rows) if self.shuffle else self.rows
+        for a in range(0, len(rows), self.batch_size):
+            yield self.batch(rows[a:a+self.batch_size])
+
+def build_block(ev, horizon=HORIZON_SEC):
+    # ev: prepared events sorted by (sid, ts) -> event features, session starts, window starts, labels
+    # one next-error search serves every horizon
+    # y_next: 0 none, 1 junk_hit, 2 good_expire
+    err = ev["err_code"].values
+    times = ev["ts"].values
+
+    s_start, s_end = session_bounds(ev["sid"].values)
+    nxt = next_error_index(err, s_start, s_end)
+    w_start = window_starts(s_start, s_end, WINDOW_EVENTS)
+    y_risk, y_next = label_windows(times, err, nxt, w_start + WINDOW_EVENTS - 1, horizon)
+
+    # one contiguous float32 block; windows stay views until written
+    feats = np.ascontiguousarray(ev[FEAT_COLS].values, dtype=np.float32)
+    return feats, s_start, w_start, y_risk, y_next
+
+def build_in_memory(csv_path, writer):
+    df = pd.read_csv(csv_path)
+    cols = pick_columns(df.columns)
+    ev = prepare_events(df, cols)
+    del df
 
     # Build sequences
-    X = []
-    y_risk = []
-    y_next = []  # 0 none, 1 junk_hit, 2 good_expire
-
-    df = df.sort_values([c_sid, c_ts]).reset_index(drop=True)
-
-    for sid, g in df.groupby(c_sid, sort=False):
-        g = g.reset_index(drop=True)
-        times = g[c_ts].values.astype(np.int64)
-
-        # precompute next error index for each position
-        err_idx = np.where(g["err_type"].values != "none")[0]
-        for i in range(len(g) - WINDOW_EVENTS):
-            w_start = i
-            w_end = i + WINDOW_EVENTS
-
-            # horizon window in time
-            t0 = times[w_end - 1]
-            tH = t0 + int(HORIZON_SEC * 1000)
-
-            # find first error after w_end-1 within horizon
-            nxt = err_idx[err_idx >= w_end]
-            label_type = 0
-            label_risk = 0
-            if len(nxt) > 0:
-                j = nxt[0]
-                if times[j] <= tH:
-                    label_risk = 1
-                    et = g.loc[j, "err_type"]
-                    label_type = 1 if et == "junk_hit" else 2 if et == "good_expire" else 0
-
-            x = g.loc[w_start:w_end-1, feat_cols].values.astype(np.float32)
-            X.append(x)
-            y_risk.append(label_risk)
-            y_next.append(label_type)
-
-    X = np.stack(X, axis=0) if X else np.zeros((0, WINDOW_EVENTS, len(feat_cols)), dtype=np.float32)
-    y_risk = np.array(y_risk, dtype=np.int64)
-    y_next = np.array(y_next, dtype=np.int64)
-
-    out = ART / "goodjunk_seq_dataset.npz"
-    np.savez_compressed(out, X=X, y_risk=y_risk, y_next=y_next,
-                        window_events=WINDOW_EVENTS, horizon_sec=HORIZON_SEC,
-                        feat_cols=np.array(feat_cols, dtype=object))
-    print("OK ->", out, "samples:", X.shape[0])
+    ev = ev.sort_values(["sid", "ts"]).reset_index(drop=True)
+    feats, s_start, w_start, y_risk, y_next = build_block(ev, writer.horizon)
+    del ev
+
+    writer.add(feats, w_start, y_risk, y_next, s_start)
+
+SHARD_PARTS = ("feats", "s_start", "w_start", "y_risk", "y_next")
+
+def _build_shard(job):
+    # pool worker: raw rows of whole sessions (already in sid, ts order) -> shard .npy files
+    df, cols, horizon, shard_dir = job
+    parts = build_block(prepare_events(df, cols), horizon)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    for name, arr in zip(SHARD_PARTS, parts):
+        np.save(shard_dir / f"{name}.npy", arr)
+    return shard_dir, len(parts[2])
+
+def build_parallel(csv_path, writer, workers):
+    # Sessions are split into contiguous (sid-ordered) shards and built in a process pool.
+    # Shards are concatenated in order, so the output is identical for any worker count.
+    df = pd.read_csv(csv_path)
+    cols = pick_columns(df.columns)
+    keys = pd.DataFrame({
+        "sid": df[cols["sid"]].astype(str),
+        "ts": pd.to_numeric(df[cols["ts"]], errors="coerce").fillna(0).astype(np.int64),
+    })
+    order = keys.sort_values(["sid", "ts"]).index.values
+    df = df.iloc[order].reset_index(drop=True)
+    s_start, _ = session_bounds(keys["sid"].values[order])
+    del keys
+
+    n = len(df)
+    n_shards = max(1, min(len(s_start), workers * 4))
+    # cut at session starts; with n appended, a target past the last start maps to n
+    starts_n = np.r_[s_start, n]
+    cuts = starts_n[np.searchsorted(starts_n, np.linspace(0, n, n_shards + 1)[1:-1])] if n else []
+    bounds = np.unique(np.r_[0, cuts, n]).astype(np.int64)
+
+    tmp = writer.out.parent / (writer.out.stem + ".shards")
+    jobs = [(df.iloc[a:b], cols, writer.horizon, tmp / f"{k:05d}") for k, (a, b) in enumerate(zip(bounds[:-1], bounds[1:]))]
+    del df
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            for shard_dir, _ in ex.map(_build_shard, jobs):
+                feats, s_start, w_start, y_risk, y_next = (
+                    np.load(shard_dir / f"{name}.npy", mmap_mode="r") for name in SHARD_PARTS)
+                writer.add(feats, w_start, y_risk, y_next, s_start)
+                del feats
+                shutil.rmtree(shard_dir)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp)
+
+def session_hashes(ev, s_start, s_end):
+    # content hash of each session's prepared events (what the windows are built from)
+    times = ev["ts"].values
+    err = ev["err_code"].values
+    feats = np.ascontiguousarray(ev[FEAT_COLS].values, dtype=np.float32)
+    out = []
+    for a, b in zip(s_start, s_end):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(times[a:b].tobytes())
+        h.update(err[a:b].tobytes())
+        h.update(feats[a:b].tobytes())
+        out.append(h.hexdigest())
+    return out
+
+def build_incremental(csv_path, writer):
+    # Append-only rebuild: sessions.json maps session_id -> {events, hash, rows=[start, stop)}.
+    # Unchanged sessions are skipped; new ones are appended; a changed session is appended
+    # again and its old rows are marked stale in manifest.json.
+    sess_path = writer.dir / "sessions.json"
+    sessions = {}
+    if sess_path.exists():
+        with open(sess_path, "r", encoding="utf-8") as f:
+            sessions = json.load(f)
+
+    df = pd.read_csv(csv_path)
+    cols = pick_columns(df.columns)
+    ev = prepare_events(df, cols)
+    del df
+    ev = ev.sort_values(["sid", "ts"]).reset_index(drop=True)
+
+    s_start, s_end = session_bounds(ev["sid"].values)
+    sids = ev["sid"].values[s_start]
+    hashes = session_hashes(ev, s_start, s_end)
+
+    todo = []
+    for k, (sid, a, b, h) in enumerate(zip(sids, s_start, s_end, hashes)):
+        old = sessions.get(sid)
+        if old and old["events"] == int(b - a) and old["hash"] == h:
+            continue
+        if old and old["rows"][1] > old["rows"][0]:
+            writer.stale_rows.append(tuple(old["rows"]))
+        todo.append(k)
+    todo = np.asarray(todo, dtype=np.int64)
+
+    lens = (s_end - s_start)[todo]
+    keep = np.repeat(np.isin(np.arange(len(s_start)), todo), s_end - s_start)
+    feats, s_start_new, w_start, y_risk, y_next = build_block(ev[keep], writer.horizon)
+    del ev
+
+    # windows come out in session order: per-session row ranges follow from the counts
+    counts = np.maximum(lens - WINDOW_EVENTS, 0)
+    row0 = writer.n + np.cumsum(counts) - counts
+    for k, n_ev, r0, c in zip(todo, lens, row0, counts):
+        sessions[sids[k]] = {"events": int(n_ev), "hash": hashes[k], "rows": [int(r0), int(r0 + c)]}
+    writer.add(feats, w_start, y_risk, y_next, s_start_new)
+
+    with open(sess_path, "w", encoding="utf-8") as f:
+        json.dump(sessions, f, ensure_ascii=False)
+    print(f"incremental: {len(todo)} new/changed of {len(sids)} sessions, +{int(counts.sum())} samples")
+
+class SessionCarry:
+    # Per-session tail buffers for chunked ingest.
+    # A buffer starts at the first window not emitted yet. A window is emitted once its
+    # label can no longer change: the next error after it is already buffered, or the
+    # session has moved past its horizon. Assumes each session's events arrive in time
+    # order across chunks (Sheet append order); ties/out-of-order inside the tail are re-sorted.
+    # The largest ts seen so far is the clock: a session whose last event is more than a
+    # horizon behind it has all its labels final, so they are emitted and its tail (the
+    # events the next window would start from) is parked. A session that resumes after a
+    # pause continues from the parked tail; tails idle longer than idle_sec are dropped.
+    def __init__(self, window, horizon_sec, idle_sec):
+        self.window = window
+        self.horizon_sec = horizon_sec
+        self.horizon_ms = int(np.max(horizon_sec) * 1000)   # longest horizon decides
+        self.idle_ms = max(int(idle_sec * 1000), self.horizon_ms)
+        self.buf = {}    # sid -> (times, err, feats), windows still to emit
+        self.idle = {}   # sid -> (times, err, feats), labels final, kept in case the session resumes
+        self.clock = None
+        self.late = 0    # rows more than a horizon behind the clock (file not time-ordered)
+
+    def _emit(self, times, err, feats, final):
+        W = self.window
+        n = len(times)
+        s_start, s_end = np.array([0]), np.array([n])
+        nxt = next_error_index(err, s_start, s_end)
+        w_start = window_starts(s_start, s_end, W)
+        w_last = w_start + W - 1
+        if final:
+            k = len(w_start)
+        else:
+            done = (nxt[w_last] >= 0) | (times[-1] > times[w_last] + self.horizon_ms)
+            k = len(done) if done.all() else int(np.argmin(done))
+        y_risk, y_next = label_windows(times, err, nxt, w_last[:k], self.horizon_sec)
+        # events covering the k emitted windows (window i starts at run[i])
+        return feats[:k + W - 1], y_risk, y_next, k
+
+    def feed(self, ev):
+        # ev: prepared chunk; yields (events run, n windows, y_risk, y_next) for windows that are final
+        ev = ev.sort_values(["sid", "ts"], kind="stable")
+        feats_all = np.ascontiguousarray(ev[FEAT_COLS].values, dtype=np.float32)
+        times_all = ev["ts"].values
+        err_all = ev["err_code"].values
+        s_start, s_end = session_bounds(ev["sid"].values)
+        sids = ev["sid"].values[s_start] if len(s_start) else []
+        if self.clock is not None:
+            self.late += int((times_all + self.horizon_ms < self.clock).sum())
+
+        for sid, a, b in zip(sids, s_start, s_end):
+            times, err, feats = times_all[a:b], err_all[a:b], feats_all[a:b]
+            prev = self.buf.pop(sid, None) or self.idle.pop(sid, None)
+            if prev is not None:
+                pt, pe, pf = prev
+                times = np.concatenate([pt, times])
+                err = np.concatenate([pe, err])
+                feats = np.concatenate([pf, feats])
+                o = np.argsort(times, kind="stable")
+                times, err, feats = times[o], err[o], feats[o]
+            run, y_risk, y_next, k = self._emit(times, err, feats, final=False)
+            if k:
+                yield run, k, y_risk, y_next
+            self.buf[sid] = (times[k:], err[k:], feats[k:])
+
+        if len(times_all):
+            t = int(times_all.max())
+            self.clock = t if self.clock is None else max(self.clock, t)
+            done = [sid for sid, (times, _, _) in self.buf.items()
+                    if not len(times) or times[-1] + self.horizon_ms < self.clock]
+            for sid in done:
+                times, err, feats = self.buf.pop(sid)
+                run, y_risk, y_next, k = self._emit(times, err, feats, final=True)
+                if k:
+                    yield run, k, y_risk, y_next
+                if len(times):
+                    self.idle[sid] = (times[k:], err[k:], feats[k:])
+            gone = [sid for sid, (times, _, _) in self.idle.items() if times[-1] + self.idle_ms < self.clock]
+            for sid in gone:
+                del self.idle[sid]
+
+    def close(self):
+        for sid, (times, err, feats) in self.buf.items():
+            run, y_risk, y_next, k = self._emit(times, err, feats, final=True)
+            if k:
+                yield run, k, y_risk, y_next
+        self.buf = {}
+        self.idle = {}
+
+def build_streaming(csv_path, writer, chunksize, idle_sec):
+    head = pd.read_csv(csv_path, nrows=0)
+    cols = pick_columns(head.columns)
+    carry = SessionCarry(WINDOW_EVENTS, writer.horizon, idle_sec)
+
+    def flush(parts):
+        # one append per chunk (not per session): runs back to back, window starts offset per run
+        parts = list(parts)
+        if not parts:
+            return
+        runs, ks, y_risk, y_next = zip(*parts)
+        lens = np.array([len(r) for r in runs], dtype=np.int64)
+        s_start = np.cumsum(lens) - lens
+        w_start = np.concatenate([a + np.arange(k) for a, k in zip(s_start, ks)])
+        writer.add(np.concatenate(runs), w_start, np.concatenate(y_risk), np.concatenate(y_next), s_start)
+
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype={cols["sid"]: str}):
+        flush(carry.feed(prepare_events(chunk, cols)))
+    flush(carry.close())
+    if carry.late:
+        print(f"warning: {carry.late} rows came more than a horizon behind the newest ts in the file; "
+              "their windows may be lost or mislabeled. --stream needs a time-ordered CSV (build without --stream).")
+
+def dataset_rows(data):
+    # all samples as sorted fixed-width byte rows (X, y_risk, y_next): equal iff same multiset
+    parts = []
+    for X, y_risk, y_next in WindowSampler(data, batch_size=65536, shuffle=False):
+        n = len(X)
+        parts.append(np.hstack([X.reshape(n, -1).astype(np.float32).view(np.uint8),
+                                y_risk.reshape(n, -1).astype(np.int64).view(np.uint8),
+                                y_next.reshape(n, -1).astype(np.int64).view(np.uint8)]))
+    if not parts:
+        return np.zeros(0, dtype=np.uint8)
+    rows = np.ascontiguousarray(np.concatenate(parts))
+    return np.sort(rows.view(np.dtype((np.void, rows.shape[1])))[:, 0])
+
+def verify_against_in_memory(csv_path, out, horizon, layout):
+    # rebuild in memory into a scratch dir and compare samples with the dataset at out
+    ref_dir = out.parent / (out.stem + ".verify")
+    ref = DatasetWriter(ref_dir, "npy", horizon=horizon, layout=layout)
+    try:
+        build_in_memory(csv_path, ref)
+        ref.close()
+        a, b = dataset_rows(load_dataset(out)), dataset_rows(load_dataset(ref_dir))
+    finally:
+        shutil.rmtree(ref_dir, ignore_errors=True)
+    if len(a) != len(b) or not np.array_equal(a, b):
+        raise SystemExit(f"verify: --stream gave {len(a)} samples, in-memory build {len(b)}; datasets differ")
+    print(f"verify: --stream matches the in-memory build ({len(a)} samples)")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--csv", default=str(DATA / "goodjunk_events.csv"), help="events tab exported as CSV")
+    ap.add_argument("--out", default=None, help="default: artifacts/goodjunk_seq_dataset(.npz)")
+    ap.add_argument("--format", choices=["npz", "npy"], default="npz",
+                    help="npz = one compressed file; npy = dir of raw .npy + manifest.json (memmap-able)")
+    ap.add_argument("--stream", action="store_true", help="read the CSV in chunks (bounded memory; rows must be in time order)")
+    ap.add_argument("--chunksize", type=int, default=200_000, help="rows per chunk in --stream mode")
+    ap.add_argument("--idle-sec", type=float, default=1800.0,
+                    help="--stream: forget a session after this long without events (a session resuming later "
+                         "loses the windows across the gap)")
+    ap.add_argument("--verify", action="store_true",
+                    help="--stream: also build in memory and check both give the same samples")
+    ap.add_argument("--horizons", default=None,
+                    help="comma-separated horizons in seconds, e.g. 2,4,8 -> y_risk/y_next get one column each")
+    ap.add_argument("--workers", type=int, default=1, help="build session shards in N processes")
+    ap.add_argument("--layout", choices=LAYOUTS, default="windows",
+                    help="windows = materialized X (N, W, F); index = event features + window-start index "
+                         "(~W x smaller, read with WindowSampler)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="npy only: append windows of new/changed sessions to the existing dataset")
+    args = ap.parse_args()
+
+    ev_path = Path(args.csv)
+    if not ev_path.exists():
+        raise SystemExit(f"Missing {ev_path}. Export events tab as CSV -> put here.")
+    if args.stream and args.workers > 1:
+        raise SystemExit("--workers is not supported with --stream")
+    if args.verify and not args.stream:
+        raise SystemExit("--verify only applies to --stream")
+    if args.incremental and (args.format != "npy" or args.stream or args.workers > 1):
+        raise SystemExit("--incremental needs --format npy (and no --stream/--workers)")
+
+    out = Path(args.out) if args.out else ART / ("goodjunk_seq_dataset.npz" if args.format == "npz" else "goodjunk_seq_dataset")
+    resume = args.incremental and (out / "manifest.json").exists() and (out / "sessions.json").exists()
+    if args.horizons:
+        hs = [float(h) for h in args.horizons.split(",") if h.strip()]
+        horizon = hs[0] if len(hs) == 1 else hs
+    else:
+        horizon = HORIZON_SEC
+    writer = DatasetWriter(out, args.format, horizon=horizon, layout=args.layout, resume=resume)
+
+    if args.incremental:
+        build_incremental(ev_path, writer)
+    elif args.stream:
+        build_streaming(ev_path, writer, args.chunksize, args.idle_sec)
+    elif args.workers > 1:
+        build_parallel(ev_path, writer, args.workers)
+    else:
+        build_in_memory(ev_path, writer)
+    writer.close()
+    print("OK ->", out, "samples:", writer.n)
+    if args.verify:
+        verify_against_in_memory(ev_path, out, horizon, args.layout)
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,15 @@
 # === /webxr-health-mobile/ml/train_goodjunk.py ===
 # GoodJunk ML Trainer — PRODUCTION STARTER (logistic regression risk model)
 # FULL v20260302-TRAIN-GOODJUNK
-import json, math, os, sys, csv
+import argparse, json, math, os, csv
 from collections import defaultdict
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np   # fast path; trainer falls back to pure Python without it
+except ImportError:
+    np = None
 
 def sigmoid(z: float) -> float:
     if z > 18: return 1.0
@@ -73,6 +80,108 @@ def featurize_session(r):
     }
     return x
 
+# raw session fields as featurize_session/label_from_session read them:
+# name -> (aliases in r.get() priority order, value when no alias column exists, safe_float default)
+SESSION_FIELDS = {
+    "shots":     (("shots", "nShots"), 0, 0.0),
+    "miss":      (("miss", "misses"), 0, 0.0),
+    "hitJunk":   (("hitsJunk", "nHitJunk"), 0, 0.0),
+    "combo":     (("combo_max", "comboMax"), 0, 0.0),
+    "timeLeft":  (("timeLeftSec",), 0, 0.0),
+    "timeAll":   (("session_time_sec_setting", "durationPlannedSec"), 80, 80.0),
+    "rtMedMs":   (("medianRtGoodMs", "rtMedMs"), 0, 0.0),
+    "feverPct":  (("feverEndPct", "feverPct"), 0, 0.0),
+    "shield":    (("shieldEnd", "shield"), 0, 0.0),
+    "score":     (("score", "scoreFinal"), 0, 0.0),
+    "completed": (("completed",), 1, 1.0),
+}
+
+def parse_float_col(values, default):
+    # column version of safe_float: each distinct cell is parsed once and mapped back
+    # (session columns are mostly low-cardinality); high-cardinality clean columns
+    # go through one C-level float() pass instead
+    n = len(values)
+    uniq = set(values)
+    if len(uniq) * 8 > n:
+        try:
+            return np.fromiter(map(float, values), dtype=np.float64, count=n)
+        except (TypeError, ValueError):
+            pass
+    cache = {v: safe_float(v, default) for v in uniq}
+    return np.fromiter(map(cache.__getitem__, values), dtype=np.float64, count=n)
+
+class SessionColumns:
+    # Resolves the alias chains of featurize_session/label_from_session once from the CSV header,
+    # then featurizes a block of raw csv rows column by column (identical values, NumPy only).
+    def __init__(self, header):
+        last = {name: i for i, name in enumerate(header)}   # DictReader: a later duplicate wins
+        self.width = len(header)
+        self.src = {}
+        for field, (aliases, missing, default) in SESSION_FIELDS.items():
+            idx = next((last[a] for a in aliases if a in last), None)
+            self.src[field] = (idx, missing, default)
+        self.diff_idx = next((last[a] for a in ("difficulty", "diff") if a in last), None)
+
+    def _col(self, rows, idx):
+        return list(map(itemgetter(idx), rows))
+
+    def _float(self, rows, field):
+        idx, missing, default = self.src[field]
+        if idx is None:
+            return np.full(len(rows), safe_float(missing, default), dtype=np.float64)
+        return parse_float_col(self._col(rows, idx), default)
+
+    def features(self, rows):
+        # rows: csv.reader rows -> (M (n, d) in FEATURES order, y (n,)), both float64
+        with np.errstate(invalid="ignore", divide="ignore"):   # inf/inf -> nan, as in Python
+            return self._features(rows)
+
+    def _features(self, rows):
+        if rows and min(map(len, rows)) < self.width:
+            # short rows: DictReader fills None (-> safe_float default, "none")
+            rows = [r + [None] * (self.width - len(r)) if len(r) < self.width else r for r in rows]
+        n = len(rows)
+        f = lambda k: self._float(rows, k)
+        pos = lambda v: np.where(v > 0.0, v, 0.0)             # max(0.0, v)
+        clip = lambda v, a, b: np.where(v < a, a, np.where(v > b, b, v))
+        below1 = lambda v: np.where(v < 1.0, v, 1.0)            # min(1.0, v)
+        ratio = lambda a, b: np.divide(a, b, out=np.zeros(n), where=b > 0)
+
+        shots_raw, miss_raw = f("shots"), f("miss")           # parsed once, used by x and y
+        shots, miss = pos(shots_raw), pos(miss_raw)
+        hitJunk, combo = pos(f("hitJunk")), pos(f("combo"))
+        timeLeft = pos(f("timeLeft"))
+        timeAll = f("timeAll")
+        timeAll = np.where(timeAll > 1.0, timeAll, 1.0)        # max(1.0, v)
+        rtMedMs = f("rtMedMs")
+
+        if self.diff_idx is None:
+            diff = np.zeros(n, dtype=np.int8)
+        else:
+            # 1 hard / 2 easy / 0 other, decided once per distinct cell
+            col = self._col(rows, self.diff_idx)
+            code = {v: {"hard": 1, "easy": 2}.get(str(v).lower(), 0) for v in set(col)}
+            diff = np.fromiter(map(code.__getitem__, col), dtype=np.int8, count=n)
+
+        M = np.empty((n, len(FEATURES)), dtype=np.float64)
+        cols = {
+            "missRate": ratio(miss, shots),
+            "junkRate": ratio(hitJunk, shots),
+            "rtMedSec": np.where(rtMedMs > 0, rtMedMs / 1000.0, 1.2),
+            "comboNorm": below1(combo / 25.0),
+            "timeLeftNorm": below1(timeLeft / timeAll),
+            "feverNorm": clip(f("feverPct"), 0.0, 100.0) / 100.0,
+            "shieldNorm": clip(f("shield"), 0.0, 3.0) / 3.0,
+            "diffHard": (diff == 1).astype(np.float64),
+            "diffEasy": (diff == 2).astype(np.float64),
+        }
+        for j, k in enumerate(FEATURES):
+            M[:, j] = cols[k]
+
+        missRate = ratio(miss_raw, shots_raw)
+        y = (missRate >= 0.28) | (f("score") < 180) | (f("completed") < 1)
+        return M, y.astype(np.float64)
+
 def label_from_session(r):
     # Define "risk event" label:
     # 1 if high miss OR low score OR quit early (adjust later)
@@ -89,8 +198,107 @@ def label_from_session(r):
 def to_vec(x, wkeys):
     return [float(x.get(k,0.0)) for k in wkeys]
 
+def to_matrix(X):
+    # list of feature dicts -> dense (n, d) float64 in FEATURES order
+    return np.array([to_vec(x, FEATURES) for x in X], dtype=np.float64).reshape(len(X), len(FEATURES))
+
+def sigmoid_np(z):
+    # same saturation as sigmoid(): exactly 0/1 beyond |z| > 18
+    p = 1.0 / (1.0 + np.exp(-np.clip(z, -18.0, 18.0)))
+    p[z > 18] = 1.0
+    p[z < -18] = 0.0
+    return p
+
+def logloss_np(y, p):
+    return float(-(y*np.log(np.maximum(1e-9, p)) + (1-y)*np.log(np.maximum(1e-9, 1-p))).mean())
+
+def train_logreg_np(M, y, lr=0.35, epochs=600, l2=0.10, tol=0.0, init=None, verbose=True):
+    # Vectorized gradient descent: one mat-vec for z and one for the gradient per epoch
+    # tol > 0: stop early once every gradient component is below tol
+    # init: a previous result dict to continue from (warm start)
+    M = np.asarray(M, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(M)
+    if n == 0:
+        return {"bias": -1.1}
+
+    w = np.zeros(M.shape[1], dtype=np.float64)
+    b = -0.5
+    if init is not None:
+        w = np.array([init[k] for k in FEATURES], dtype=np.float64)
+        b = init["bias"]
+    for ep in range(epochs):
+        p = sigmoid_np(M @ w + b)
+        dz = p - y
+        gb = dz.sum() / n
+        gw = (M.T @ dz) / n + l2 * w
+
+        if verbose and ep % 100 == 0:
+            # logloss (before this epoch's update, as in the loop version)
+            print(f"epoch {ep:4d} loss={logloss_np(y, p):.4f}")
+        if tol > 0 and max(abs(gb), float(np.abs(gw).max())) < tol:
+            if verbose:
+                print(f"gd: converged after {ep} epochs, loss={logloss_np(y, p):.6f}")
+            break
+
+        b -= lr*gb
+        w -= lr*gw
+
+    out = {"bias": float(b)}
+    out.update({k: float(v) for k, v in zip(FEATURES, w)})
+    return out
+
+def train_logreg_newton(M, y, l2=0.10, max_iter=50, tol=1e-8):
+    # Newton / IRLS on the same objective as the GD trainers:
+    #   mean logloss + l2/2 * |w|^2 (bias not penalized), start at w=0, b=-0.5
+    # d+1 <= 10 unknowns, so each step is one weighted X^T S X and a tiny solve.
+    # Backtracks (halves the step) if a full step does not lower the objective.
+    M = np.asarray(M, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n, d = M.shape
+    if n == 0:
+        return {"bias": -1.1}
+
+    A = np.hstack([np.ones((n, 1)), M])   # bias is column 0
+    reg = np.full(d + 1, l2)
+    reg[0] = 0.0
+    theta = np.zeros(d + 1)
+    theta[0] = -0.5
+
+    def objective(th):
+        p = sigmoid_np(A @ th)
+        return logloss_np(y, p) + 0.5 * float(np.sum(reg * th * th)), p
+
+    obj, p = objective(theta)
+    it = 0
+    for it in range(1, max_iter + 1):
+        g = A.T @ (p - y) / n + reg * theta
+        H = (A.T * (p * (1 - p))) @ A / n + np.diag(reg + 1e-9)
+        step = np.linalg.solve(H, g)
+        t = 1.0
+        while True:
+            cand = theta - t * step
+            cand_obj, cand_p = objective(cand)
+            if cand_obj <= obj or t < 1e-4:
+                break
+            t *= 0.5
+        theta, obj, p = cand, cand_obj, cand_p
+        if float(np.abs(t * step).max()) < tol:
+            break
+
+    print(f"newton: {it} iterations, loss={logloss_np(y, p):.6f}")
+    out = {"bias": float(theta[0])}
+    out.update({k: float(v) for k, v in zip(FEATURES, theta[1:])})
+    return out
+
 def train_logreg_gd(X, y, lr=0.35, epochs=600, l2=0.10):
     # Simple gradient descent logistic regression
+    if np is not None:
+        return train_logreg_np(to_matrix(X), y, lr=lr, epochs=epochs, l2=l2)
+    return train_logreg_py(X, y, lr=lr, epochs=epochs, l2=l2)
+
+def train_logreg_py(X, y, lr=0.35, epochs=600, l2=0.10):
+    # pure-Python fallback (no NumPy)
     w = {k:0.0 for k in FEATURES}
     b = -0.5
 
@@ -134,27 +342,231 @@ def train_logreg_gd(X, y, lr=0.35, epochs=600, l2=0.10):
     out.update(w)
     return out
 
-def main():
-    if len(sys.argv) < 2:
-        print("Usage: python train_goodjunk.py sessions.csv [out.json]")
-        sys.exit(1)
+def read_csv_rows(path):
+    # header + raw row lists (blank lines skipped, like DictReader)
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        return header, [r for r in reader if r]
+
+def row_dict(header, r):
+    # csv.DictReader row from a raw row
+    d = dict(zip(header, r))
+    for k in header[len(r):]:
+        d[k] = None
+    return d
+
+def iter_csv_batches(path, batch_size):
+    # stream raw rows in mini-batches -> (header, rows); only one batch is alive at a time
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        batch = []
+        for r in reader:
+            if not r:
+                continue
+            batch.append(r)
+            if len(batch) >= batch_size:
+                yield header, batch
+                batch = []
+        if batch:
+            yield header, batch
+
+def featurize_rows(header, rows, cols=None):
+    # raw rows -> (X, y): SessionColumns matrices with NumPy, row-dict lists without
+    if np is not None:
+        return (cols or SessionColumns(header)).features(rows)
+    dicts = [row_dict(header, r) for r in rows]
+    return [to_vec(featurize_session(r), FEATURES) for r in dicts], [label_from_session(r) for r in dicts]
+
+def sgd_step(w, b, Xb, yb, lr, l2):
+    # one mini-batch update (avg logloss gradient + l2); returns (w, b, batch loss sum)
+    m = len(yb)
+    if np is not None:
+        M = np.asarray(Xb, dtype=np.float64)
+        yv = np.asarray(yb, dtype=np.float64)
+        p = sigmoid_np(M @ w + b)
+        loss = -(yv*np.log(np.maximum(1e-9, p)) + (1-yv)*np.log(np.maximum(1e-9, 1-p))).sum()
+        dz = p - yv
+        w = w - lr * ((M.T @ dz) / m + l2 * w)
+        b = b - lr * float(dz.sum() / m)
+        return w, b, float(loss)
+
+    gw = [0.0] * len(FEATURES)
+    gb = 0.0
+    loss = 0.0
+    for xi, yi in zip(Xb, yb):
+        p = sigmoid(b + sum(wk * xk for wk, xk in zip(w, xi)))
+        loss += -(yi*math.log(max(1e-9,p)) + (1-yi)*math.log(max(1e-9,1-p)))
+        dz = p - yi
+        gb += dz
+        for k in range(len(FEATURES)):
+            gw[k] += dz * xi[k]
+    w = [wk - lr * (g / m + l2 * wk) for wk, g in zip(w, gw)]
+    b = b - lr * gb / m
+    return w, b, loss
+
+def train_logreg_sgd_stream(path, passes=5, batch_size=512, lr=0.35, l2=0.10, lr_decay=0.0):
+    # Constant-memory mini-batch SGD straight off the CSV (several passes over the file).
+    # lr_decay > 0 -> inverse-scaling schedule lr_t = lr / (1 + lr_decay * t), t = batch step
+    w = np.zeros(len(FEATURES), dtype=np.float64) if np is not None else [0.0] * len(FEATURES)
+    b = -0.5
+    t = 0
+    n = 0
+    for ep in range(passes):
+        n = 0
+        loss = 0.0
+        cols = None
+        for header, rows in iter_csv_batches(path, batch_size):
+            if np is not None and cols is None:
+                cols = SessionColumns(header)
+            Xb, yb = featurize_rows(header, rows, cols)
+            w, b, l = sgd_step(w, b, Xb, yb, lr / (1.0 + lr_decay * t), l2)
+            loss += l
+            n += len(rows)
+            t += 1
+        if n == 0:
+            return {"bias": -1.1}, 0
+        print(f"pass {ep:3d} loss={loss / n:.4f} lr={lr / (1.0 + lr_decay * t):.4f}")
+
+    out = {"bias": float(b)}
+    out.update({k: float(v) for k, v in zip(FEATURES, w)})
+    return out, n
+
+_SWEEP = {}
+
+def _sweep_init(M_tr, y_tr, M_va, y_va):
+    # pool initializer: ship the split to each worker once
+    _SWEEP.update(M_tr=M_tr, y_tr=y_tr, M_va=M_va, y_va=y_va)
+
+def _sweep_chain(job):
+    # one (lr, l2) pair; epochs ascending, each run continues the previous one (warm start),
+    # which equals a cold run of that many epochs
+    lr, l2, epochs_list = job
+    d = _SWEEP
+    w, done, out = None, 0, []
+    for ep in sorted(epochs_list):
+        w = train_logreg_np(d["M_tr"], d["y_tr"], lr=lr, epochs=ep - done, l2=l2, init=w, verbose=False)
+        done = ep
+        p = sigmoid_np(d["M_va"] @ np.array([w[k] for k in FEATURES]) + w["bias"])
+        out.append({"lr": lr, "l2": l2, "epochs": ep,
+                    "val_loss": logloss_np(d["y_va"], p),
+                    "val_acc": float(((p >= 0.5) == (d["y_va"] >= 0.5)).mean()) if len(p) else 0.0})
+    return out
 
-    sessions_path = sys.argv[1]
-    out_path = sys.argv[2] if len(sys.argv) >= 3 else "goodjunk_weights.json"
+def sweep(M, y, lrs, l2s, epochs_list, n_random=0, holdout=0.2, seed=42, workers=None):
+    # Grid (or n_random log-uniform lr/l2 draws) over a process pool, scored on a held-out split.
+    # Returns rows ranked by validation logloss.
+    rng = np.random.default_rng(seed)
+    perm = rng.permutation(len(M))
+    n_va = max(1, int(len(M) * holdout))
+    va, tr = perm[:n_va], perm[n_va:]
+    if n_random:
+        lo_lr, hi_lr = np.log(min(lrs)), np.log(max(lrs))
+        lo_l2, hi_l2 = np.log(max(min(l2s), 1e-6)), np.log(max(max(l2s), 1e-6))
+        pairs = [(float(np.exp(rng.uniform(lo_lr, hi_lr))), float(np.exp(rng.uniform(lo_l2, hi_l2))))
+                 for _ in range(n_random)]
+    else:
+        pairs = [(lr, l2) for lr in lrs for l2 in l2s]
+    jobs = [(lr, l2, epochs_list) for lr, l2 in pairs]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_sweep_init,
+                             initargs=(M[tr], y[tr], M[va], y[va])) as ex:
+        rows = [r for chain in ex.map(_sweep_chain, jobs) for r in chain]
+    rows.sort(key=lambda r: (r["val_loss"], -r["val_acc"]))
+    return rows
 
-    rows = read_csv(sessions_path)
+def print_sweep_table(rows, top=15):
+    print(f"{'rank':>4} {'lr':>8} {'l2':>8} {'epochs':>6} {'val_loss':>9} {'val_acc':>7}")
+    for i, r in enumerate(rows[:top]):
+        print(f"{i+1:4d} {r['lr']:8.4f} {r['l2']:8.4f} {r['epochs']:6d} {r['val_loss']:9.5f} {r['val_acc']:7.3f}")
 
-    X = []
-    y = []
-    for r in rows:
-        x = featurize_session(r)
-        X.append(x)
-        y.append(label_from_session(r))
+def write_sweep_csv(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=["rank", "lr", "l2", "epochs", "val_loss", "val_acc"])
+        w.writeheader()
+        for i, r in enumerate(rows):
+            w.writerow({"rank": i + 1, **r})
 
-    print(f"Loaded sessions: {len(rows)}")
+def parse_floats(s):
+    return [float(v) for v in s.split(",") if v.strip()]
 
-    # train
-    w = train_logreg_gd(X, y)
+def main():
+    ap = argparse.ArgumentParser(usage="python train_goodjunk.py sessions.csv [out.json] [--stream ...]")
+    ap.add_argument("sessions_csv")
+    ap.add_argument("out_json", nargs="?", default="goodjunk_weights.json")
+    ap.add_argument("--stream", action="store_true", help="mini-batch SGD over the CSV, constant memory")
+    ap.add_argument("--batch", type=int, default=512, help="--stream mini-batch size")
+    ap.add_argument("--passes", type=int, default=5, help="--stream passes over the CSV")
+    ap.add_argument("--lr", type=float, default=0.35)
+    ap.add_argument("--l2", type=float, default=0.10)
+    ap.add_argument("--epochs", type=int, default=600)
+    ap.add_argument("--lr-decay", type=float, default=0.0, help="--stream: lr / (1 + decay * step); 0 = constant")
+    ap.add_argument("--solver", choices=["gd", "newton"], default="gd",
+                    help="newton = IRLS, converges in a handful of iterations (needs NumPy)")
+    ap.add_argument("--tol", type=float, default=None,
+                    help="early-stop tolerance (newton: step size, default 1e-8; gd: gradient, default off)")
+    ap.add_argument("--sweep", action="store_true",
+                    help="lr/l2/epochs search in a process pool, scored on a held-out split; saves the winner")
+    ap.add_argument("--sweep-lr", default="0.05,0.1,0.2,0.35,0.6")
+    ap.add_argument("--sweep-l2", default="0.001,0.01,0.05,0.1,0.3")
+    ap.add_argument("--sweep-epochs", default="100,200,400,600,1000")
+    ap.add_argument("--sweep-random", type=int, default=0,
+                    help="N random log-uniform (lr, l2) draws within the --sweep-lr/--sweep-l2 range instead of the grid")
+    ap.add_argument("--holdout", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--workers", type=int, default=None, help="--sweep processes (default: all cores)")
+    args = ap.parse_args()
+
+    sessions_path = args.sessions_csv
+    out_path = args.out_json
+
+    if args.sweep and (args.stream or np is None):
+        raise SystemExit("--sweep needs NumPy and the in-memory trainer (no --stream)")
+
+    if args.stream:
+        w, n = train_logreg_sgd_stream(sessions_path, passes=args.passes, batch_size=args.batch,
+                                       lr=args.lr, l2=args.l2, lr_decay=args.lr_decay)
+        print(f"Streamed sessions: {n}")
+    elif np is not None:
+        # header-resolved columnar featurization
+        header, rows = read_csv_rows(sessions_path)
+        M, y = SessionColumns(header).features(rows)
+        del rows
+        print(f"Loaded sessions: {len(M)}")
+
+        # train
+        if args.sweep:
+            rows = sweep(M, y, parse_floats(args.sweep_lr), parse_floats(args.sweep_l2),
+                         [int(e) for e in parse_floats(args.sweep_epochs)], n_random=args.sweep_random,
+                         holdout=args.holdout, seed=args.seed, workers=args.workers)
+            print_sweep_table(rows)
+            table_path = os.path.splitext(out_path)[0] + ".sweep.csv"
+            write_sweep_csv(table_path, rows)
+            print("Sweep table:", table_path)
+            best = rows[0]
+            print(f"Best: lr={best['lr']:.4f} l2={best['l2']:.4f} epochs={best['epochs']} -> refit on all sessions")
+            w = train_logreg_np(M, y, lr=best["lr"], l2=best["l2"], epochs=best["epochs"], verbose=False)
+        elif args.solver == "newton":
+            w = train_logreg_newton(M, y, l2=args.l2, tol=args.tol if args.tol is not None else 1e-8)
+        else:
+            w = train_logreg_np(M, y, lr=args.lr, epochs=args.epochs, l2=args.l2, tol=args.tol or 0.0)
+    else:
+        rows = read_csv(sessions_path)
+
+        X = []
+        y = []
+        for r in rows:
+            x = featurize_session(r)
+            X.append(x)
+            y.append(label_from_session(r))
+
+        print(f"Loaded sessions: {len(rows)}")
+
+        # train
+        if args.solver == "newton":
+            print("NumPy not available: --solver newton falls back to gd")
+        w = train_logreg_gd(X, y, lr=args.lr, epochs=args.epochs, l2=args.l2)
 
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(w, f, ensure_ascii=False, indent=2)
@@ -163,4 +575,4 @@ def main():
     print("Tip: paste JSON into localStorage key HHA_GJ_MODEL_W in browser.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
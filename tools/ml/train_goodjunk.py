@@ -2,44 +2,121 @@
 # Train 2-task logistic models from ML recorder JSONL
 # Outputs: /herohealth/vr/goodjunk-model.js
 # FULL v20260301-TRAIN-EXPORT
-import os, json, argparse
+import os, csv, glob, json, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
-def load_jsonl(path):
-  rows = []
+FEATURE_ORDER = [
+  "miss","dMiss","accPct","accRecent","combo","feverPct","shield",
+  "missGoodExpired","missJunkHit","medianRtGoodMs"
+]
+
+def expand_jsonl_inputs(specs):
+  # files, globs, or directories (-> mlrec_*.jsonl inside); sorted, de-duplicated, order kept
+  paths = []
+  for spec in specs:
+    if os.path.isdir(spec):
+      found = sorted(glob.glob(os.path.join(spec, "mlrec_*.jsonl")))
+    elif glob.has_magic(spec):
+      found = sorted(glob.glob(spec))
+    else:
+      found = [spec]
+    for p in found:
+      if p not in paths:
+        paths.append(p)
+  return paths
+
+def read_frames_xy(path):
+  # One file -> (X float32, y1, y3) without keeping row dicts or lines.
+  # Pass 1 counts candidate lines to size the arrays, pass 2 parses them straight in.
+  # Cheap substring prefilter: only lines that can be frames reach json.loads.
   with open(path, "r", encoding="utf-8") as f:
+    n = sum(1 for line in f if '"frame"' in line)
+    d = len(FEATURE_ORDER)
+    X = np.empty((n, d), dtype=np.float32)
+    y1 = np.empty(n, dtype=np.int64)
+    y3 = np.empty(n, dtype=np.int64)
+    k = 0
+    f.seek(0)
     for line in f:
-      line = line.strip()
-      if not line: 
+      if '"frame"' not in line:
         continue
       obj = json.loads(line)
-      if obj.get("type") == "frame":
-        rows.append(obj)
-  return rows
+      if obj.get("type") != "frame":
+        continue
+      y = obj.get("y", {})
+      h, m = y.get("hazardRisk_1s"), y.get("miss_3s")
+      if h is None or m is None:
+        continue
+      x = obj.get("x", {})
+      row = X[k]
+      for j, key in enumerate(FEATURE_ORDER):
+        v = x.get(key, 0.0)
+        row[j] = 0.0 if v is None else float(v)
+      y1[k] = int(h)
+      y3[k] = int(m)
+      k += 1
+  return X[:k], y1[:k], y3[:k]
 
-FEATURE_ORDER = [
-  "miss","dMiss","accPct","accRecent","combo","feverPct","shield",
-  "missGoodExpired","missJunkHit","medianRtGoodMs"
-]
+def _cache_key(path):
+  st = os.stat(path)
+  return {"path": os.path.abspath(path), "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+          "features": FEATURE_ORDER}
 
-def to_xy(rows):
-  X = []
-  y1 = []  # hazardRisk_1s
-  y3 = []  # miss_3s
-  for r in rows:
-    x = r.get("x", {})
-    y = r.get("y", {})
-    if y.get("hazardRisk_1s") is None or y.get("miss_3s") is None:
-      continue
-    vec = []
-    for k in FEATURE_ORDER:
-      v = x.get(k, 0.0)
-      if v is None: v = 0.0
-      vec.append(float(v))
-    X.append(vec)
-    y1.append(int(y["hazardRisk_1s"]))
-    y3.append(int(y["miss_3s"]))
-  return np.asarray(X, dtype=np.float32), np.asarray(y1, dtype=np.int64), np.asarray(y3, dtype=np.int64)
+def _cache_file(cache_dir, key):
+  return os.path.join(cache_dir, hashlib.sha1(key["path"].encode("utf-8")).hexdigest()[:20] + ".npz")
+
+def cache_load(cache_dir, path):
+  # parsed (X, y1, y3) for path if the cache entry matches its current size/mtime, else None
+  key = _cache_key(path)
+  fn = _cache_file(cache_dir, key)
+  if not os.path.exists(fn):
+    return None
+  try:
+    with np.load(fn) as z:
+      if json.loads(str(z["key"])) != key:
+        return None
+      return z["X"], z["y1"].astype(np.int64), z["y3"].astype(np.int64)
+  except (OSError, ValueError, KeyError):
+    return None
+
+def cache_save(cache_dir, path, X, y1, y3):
+  key = _cache_key(path)
+  fn = _cache_file(cache_dir, key)
+  os.makedirs(cache_dir, exist_ok=True)
+  # labels are 0/1: int8 keeps the entry ~X-sized
+  small = all(len(y) == 0 or (y.min() >= -128 and y.max() <= 127) for y in (y1, y3))
+  ydt = np.int8 if small else np.int64
+  tmp = fn + ".tmp.npz"
+  np.savez(tmp, key=np.array(json.dumps(key)), X=X, y1=y1.astype(ydt), y3=y3.astype(ydt))
+  os.replace(tmp, fn)
+
+def load_xy(paths, workers=None, cache_dir=None):
+  # files parsed in parallel, stacked in input order into one preallocated block
+  # cache_dir: per-file feature cache keyed by path/size/mtime; only new or changed files are parsed
+  parts = [cache_load(cache_dir, p) if cache_dir else None for p in paths]
+  todo = [i for i, part in enumerate(parts) if part is None]
+  if cache_dir:
+    print(f"Feature cache: {len(paths) - len(todo)} hit, {len(todo)} to parse")
+  if len(todo) > 1 and workers != 1:
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+      fresh = list(ex.map(read_frames_xy, [paths[i] for i in todo]))
+  else:
+    fresh = [read_frames_xy(paths[i]) for i in todo]
+  for i, part in zip(todo, fresh):
+    parts[i] = part
+    if cache_dir:
+      cache_save(cache_dir, paths[i], *part)
+  n = sum(len(p[0]) for p in parts)
+  X = np.empty((n, len(FEATURE_ORDER)), dtype=np.float32)
+  y1 = np.empty(n, dtype=np.int64)
+  y3 = np.empty(n, dtype=np.int64)
+  i = 0
+  for Xp, y1p, y3p in parts:
+    j = i + len(Xp)
+    X[i:j], y1[i:j], y3[i:j] = Xp, y1p, y3p
+    i = j
+  return X, y1, y3
 
 def standardize_fit(X):
   mu = X.mean(axis=0)
@@ -49,35 +126,248 @@ def standardize_fit(X):
 def standardize_apply(X, mu, sd):
   return (X - mu) / sd
 
-def train_logreg(X, y, lr=0.08, steps=1200, l2=0.02):
-  # simple logistic regression (GD) to avoid dependency
+def logloss(y, p):
+  p = np.clip(p, 1e-7, 1 - 1e-7)
+  return float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).mean())
+
+def train_logreg(X, y, lr=0.08, steps=1200, l2=0.02, tol=0.0, init=None):
+  # one head: train_logreg_multi with k = 1; init / result are (b, w)
+  if init is not None:
+    init = (np.array([init[0]]), np.asarray(init[1])[:, None])
+  b, W = train_logreg_multi(X, y, lr=lr, steps=steps, l2=l2, tol=tol, init=init)
+  return float(b[0]), W[:, 0].copy()
+
+def train_logreg_multi(X, Y, lr=0.08, steps=1200, l2=0.02, tol=0.0, init=None):
+  # all heads in one pass: W is (d, k), so each step is one X @ W and one X.T @ R for every head
+  # float32 throughout; tol > 0 freezes each head on its own once its gradient is below tol
+  # init: (b (k,), W (d, k)) from a previous run to continue from (warm start)
+  X = np.asarray(X, dtype=np.float32)
+  Y = np.asarray(Y, dtype=np.float32)
+  if Y.ndim == 1:
+    Y = Y[:, None]
+  n, d = X.shape
+  k = Y.shape[1]
+  W = np.zeros((d, k), dtype=np.float32)
+  b = np.zeros((k,), dtype=np.float32)
+  if init is not None:
+    b, W = np.array(init[0], dtype=np.float32), np.array(init[1], dtype=np.float32)
+  lr, l2, inv_n = np.float32(lr), np.float32(l2), np.float32(1.0 / n)
+  taken = np.full(k, steps)
+  cols = np.arange(k)
+  Ya = Y
+  with np.errstate(over="ignore"):
+    for t in range(steps):
+      Wa = W if len(cols) == k else W[:, cols]
+      P = 1.0 / (1.0 + np.exp(-(X @ Wa + b[cols])))
+      R = P - Ya
+      gW = (X.T @ R) * inv_n + l2 * Wa
+      gb = R.mean(axis=0)
+      if tol > 0:
+        done = np.maximum(np.abs(gb), np.abs(gW).max(axis=0)) < tol
+        if done.any():
+          taken[cols[done]] = t + 1
+          keep = ~done
+          cols, gW, gb = cols[keep], gW[:, keep], gb[keep]
+          if len(cols) == 0:
+            break
+          Ya = Y[:, cols]
+      if len(cols) == k:
+        W -= lr * gW
+        b -= lr * gb
+      else:
+        W[:, cols] -= lr * gW
+        b[cols] -= lr * gb
+  if tol > 0:
+    with np.errstate(over="ignore"):
+      P = 1.0 / (1.0 + np.exp(-(X @ W + b)))
+    for j in range(k):
+      print(f"  gd[{j}]: {taken[j]} steps, loss={logloss(Y[:, j], P[:, j]):.6f}")
+  return b, W
+
+def train_logreg_newton(X, y, l2=0.02, max_iter=50, tol=1e-7):
+  # Newton / IRLS on the GD objective (mean logloss + l2/2 |w|^2, bias free).
+  # d = 10 features -> one (11 x 11) solve per iteration; halves the step if the objective rises.
   n, d = X.shape
-  w = np.zeros((d,), dtype=np.float32)
-  b = 0.0
-  for t in range(steps):
-    z = X @ w + b
-    p = 1.0 / (1.0 + np.exp(-z))
-    # gradients
-    grad_w = (X.T @ (p - y)) / n + l2 * w
-    grad_b = float((p - y).mean())
-    w -= lr * grad_w
-    b -= lr * grad_b
-  return float(b), w.astype(np.float32)
-
-def auc_like(y, p):
-  # quick proxy: accuracy at 0.5 + balanced accuracy (no heavy deps)
-  y = y.astype(np.int64)
-  pred = (p >= 0.5).astype(np.int64)
-  acc = float((pred == y).mean())
-  # balanced
-  pos = (y == 1)
-  neg = (y == 0)
-  tpr = float((pred[pos] == 1).mean()) if pos.any() else 0.0
-  tnr = float((pred[neg] == 0).mean()) if neg.any() else 0.0
-  bal = 0.5 * (tpr + tnr)
-  return acc, bal
-
-def export_js(out_path, mu, sd, b1, w1, b3, w3):
+  A = np.hstack([np.ones((n, 1)), X.astype(np.float64)])
+  yy = y.astype(np.float64)
+  reg = np.full(d + 1, l2)
+  reg[0] = 0.0
+  theta = np.zeros(d + 1)
+
+  def objective(th):
+    p = 1.0 / (1.0 + np.exp(-(A @ th)))
+    return logloss(yy, p) + 0.5 * float(np.sum(reg * th * th)), p
+
+  obj, p = objective(theta)
+  it = 0
+  for it in range(1, max_iter + 1):
+    g = A.T @ (p - yy) / n + reg * theta
+    H = (A.T * (p * (1 - p))) @ A / n + np.diag(reg + 1e-9)
+    step = np.linalg.solve(H, g)
+    s = 1.0
+    while True:
+      cand = theta - s * step
+      cand_obj, cand_p = objective(cand)
+      if cand_obj <= obj or s < 1e-4:
+        break
+      s *= 0.5
+    theta, obj, p = cand, cand_obj, cand_p
+    if float(np.abs(s * step).max()) < tol:
+      break
+  print(f"  newton: {it} iterations, loss={logloss(yy, p):.6f}")
+  return float(theta[0]), theta[1:].astype(np.float32)
+
+_SWEEP = {}
+
+def _sweep_init(Xtr, y1tr, y3tr, Xva, y1va, y3va):
+  # pool initializer: ship the split to each worker once
+  _SWEEP.update(Xtr=Xtr, y1tr=y1tr, y3tr=y3tr, Xva=Xva, y1va=y1va, y3va=y3va)
+
+def _sweep_chain(job):
+  # one (lr, l2) pair, steps ascending; each checkpoint continues the previous one
+  # (warm start), which equals a cold run of that many steps
+  lr, l2, steps_list = job
+  d = _SWEEP
+  Ytr = np.stack([d["y1tr"], d["y3tr"]], axis=1)
+  h = None
+  done = 0
+  out = []
+  for st in sorted(steps_list):
+    h = train_logreg_multi(d["Xtr"], Ytr, lr=lr, steps=st - done, l2=l2, init=h)
+    done = st
+    P = 1/(1+np.exp(-(d["Xva"] @ h[1] + h[0])))
+    p1, p3 = P[:, 0], P[:, 1]
+    l1, l3 = logloss(d["y1va"], p1), logloss(d["y3va"], p3)
+    out.append({"lr": lr, "l2": l2, "steps": st, "val_loss": 0.5 * (l1 + l3),
+                "val_loss_hazard": l1, "val_loss_miss3": l3})
+  return out
+
+def sweep(X, y1, y3, lrs, l2s, steps_list, n_random=0, holdout=0.2, seed=42, workers=None):
+  # grid (or n_random log-uniform lr/l2 draws) over a process pool; STD is fit on the
+  # train split only, scored by the mean held-out logloss of both heads
+  rng = np.random.default_rng(seed)
+  perm = rng.permutation(len(X))
+  n_va = max(1, int(len(X) * holdout))
+  va, tr = perm[:n_va], perm[n_va:]
+  mu, sd = standardize_fit(X[tr])
+  Xtr = standardize_apply(X[tr], mu, sd)
+  Xva = standardize_apply(X[va], mu, sd)
+  if n_random:
+    lo_lr, hi_lr = np.log(min(lrs)), np.log(max(lrs))
+    lo_l2, hi_l2 = np.log(max(min(l2s), 1e-6)), np.log(max(max(l2s), 1e-6))
+    pairs = [(float(np.exp(rng.uniform(lo_lr, hi_lr))), float(np.exp(rng.uniform(lo_l2, hi_l2))))
+             for _ in range(n_random)]
+  else:
+    pairs = [(lr, l2) for lr in lrs for l2 in l2s]
+  jobs = [(lr, l2, steps_list) for lr, l2 in pairs]
+
+  with ProcessPoolExecutor(max_workers=workers, initializer=_sweep_init,
+                           initargs=(Xtr, y1[tr], y3[tr], Xva, y1[va], y3[va])) as ex:
+    rows = [r for chain in ex.map(_sweep_chain, jobs) for r in chain]
+  rows.sort(key=lambda r: r["val_loss"])
+  return rows
+
+def write_sweep_csv(path, rows):
+  with open(path, "w", encoding="utf-8", newline="") as f:
+    w = csv.DictWriter(f, fieldnames=["rank", "lr", "l2", "steps", "val_loss", "val_loss_hazard", "val_loss_miss3"])
+    w.writeheader()
+    for i, r in enumerate(rows):
+      w.writerow({"rank": i + 1, **r})
+
+def parse_floats(s):
+  return [float(v) for v in s.split(",") if v.strip()]
+
+def fold_standardization(mu, sd, b, w):
+  # b + w . ((x - mu) / sd)  ==  (b - sum(w * mu / sd)) + (w / sd) . x   (float64)
+  wf = np.asarray(w, dtype=np.float64) / np.asarray(sd, dtype=np.float64)
+  bf = float(b) - float(np.dot(wf, np.asarray(mu, dtype=np.float64)))
+  return bf, wf
+
+def _predict_folded_js(mu, sd, b1, w1, b3, w3):
+  # one interleaved params block [w1_i, w3_i, ...]; the scoring loop reads xVecRaw directly, no per-frame allocation
+  # fold the biases as printed in WEIGHTS (8 decimals) so both paths score the same model
+  bf1, wf1 = fold_standardization(mu, sd, float(f"{b1:.8f}"), w1)
+  bf3, wf3 = fold_standardization(mu, sd, float(f"{b3:.8f}"), w3)
+  inter = np.empty(2 * len(wf1))
+  inter[0::2], inter[1::2] = wf1, wf3
+  return f"""// Folded params: STD merged into the weights at export time (w/sd, b - w.mu/sd), interleaved per feature
+const NF = {len(wf1)};
+const FOLD_W = Float64Array.from({json.dumps(inter.tolist())});
+const FOLD_B1 = {repr(bf1)};
+const FOLD_B3 = {repr(bf3)};
+const FOLD_MU = Float64Array.from({json.dumps([float(v) for v in np.asarray(mu).tolist()])});
+
+export function predictProba(xVecRaw){{
+  try{{
+    const n = xVecRaw.length;
+    let z1 = FOLD_B1, z3 = FOLD_B3;
+    for(let i=0, j=0; i<NF; i++, j+=2){{
+      // missing / non-numeric -> mu, i.e. a standardized 0 (same as the unfolded export)
+      let v = i < n ? Number(xVecRaw[i]||0) : FOLD_MU[i];
+      if(v !== v) v = FOLD_MU[i];
+      z1 += FOLD_W[j] * v;
+      z3 += FOLD_W[j + 1] * v;
+    }}
+    return {{ hazardRisk: sigmoid(z1), miss3s: sigmoid(z3) }};
+  }}catch(e){{
+    return {{ hazardRisk: 0.15, miss3s: 0.08 }};
+  }}
+}}
+"""
+
+def eval_binary(y, p, curve=False):
+  # Rank-based binary metrics from one sort, O(n log n), no sklearn:
+  #   auc     ROC AUC (ties count 1/2, same as roc_auc_score)
+  #   pr_auc  average precision (step-wise PR area, same as average_precision_score)
+  #   logloss, acc / bal at 0.5, f1 at 0.5, best F1 over every distinct threshold
+  # curve=True also returns the full F1-vs-threshold sweep
+  y = np.asarray(y).astype(np.float64).ravel()
+  p = np.asarray(p, dtype=np.float64).ravel()
+  n = len(y)
+  order = np.argsort(-p, kind="mergesort")
+  ps, ys = p[order], y[order]
+  # cut points at the last row of every run of equal scores
+  last = np.r_[np.flatnonzero(ps[1:] != ps[:-1]), n - 1] if n else np.zeros(0, dtype=np.int64)
+  tp = np.cumsum(ys)[last]
+  fp = (last + 1) - tp
+  thr = ps[last]
+  P = float(tp[-1]) if n else 0.0
+  N = float(fp[-1]) if n else 0.0
+
+  if P > 0 and N > 0:
+    tp0, fp0 = np.r_[0.0, tp], np.r_[0.0, fp]
+    auc = float(np.sum(np.diff(fp0) * (tp0[1:] + tp0[:-1])) / (2.0 * P * N))
+  else:
+    auc = 0.5
+  if P > 0:
+    prec = tp / (tp + fp)
+    pr_auc = float(np.sum(np.diff(np.r_[0.0, tp]) * prec) / P)
+  else:
+    pr_auc = 0.0
+  f1 = 2.0 * tp / np.maximum(2.0 * tp + fp + (P - tp), 1e-12)
+  best = int(np.argmax(f1)) if n else 0
+
+  # at 0.5: rows with p >= 0.5 are the prefix of the sorted order
+  k = int(np.searchsorted(-ps, -0.5, side="right"))
+  tp5 = float(ys[:k].sum())
+  fp5 = k - tp5
+  acc = (tp5 + (N - fp5)) / n if n else 0.0
+  tpr = tp5 / P if P else 0.0
+  tnr = (N - fp5) / N if N else 0.0
+  out = {
+    "n": n, "pos_rate": P / n if n else 0.0,
+    "auc": auc, "pr_auc": pr_auc, "logloss": logloss(y, p) if n else 0.0,
+    "acc": float(acc), "bal": 0.5 * (tpr + tnr),
+    "f1_at_0.5": 2.0 * tp5 / max(2.0 * tp5 + fp5 + (P - tp5), 1e-12),
+    "f1_best": float(f1[best]) if n else 0.0, "thr_best": float(thr[best]) if n else 0.5,
+  }
+  if curve:
+    out["curve"] = {"threshold": thr, "f1": f1, "precision": tp / (tp + fp), "recall": tp / P if P else tp * 0.0}
+  return out
+
+def export_js(out_path, mu, sd, b1, w1, b3, w3, fold=False):
+  # fold=True: predictProba uses weights with mu/sd folded in (no per-frame standardization);
+  # STD / WEIGHTS are still exported unchanged
   js = f"""// === /herohealth/vr/goodjunk-model.js ===
 // Exported model for GoodJunk predictions
 // Generated by tools/ml/train_goodjunk.py
@@ -104,7 +394,7 @@ export const WEIGHTS = {{
   miss_3s:       {{ b: {b3:.8f}, w: {json.dumps([float(x) for x in w3.tolist()])} }}
 }};
 
-export function predictProba(xVecRaw){{
+""" + (_predict_folded_js(mu, sd, b1, w1, b3, w3) if fold else f"""export function predictProba(xVecRaw){{
   try{{
     const x = xVecRaw.map((v,i)=> (Number(v||0) - STD.mu[i]) / (STD.sd[i]||1e-6));
     const h = sigmoid(WEIGHTS.hazardRisk_1s.b + dot(WEIGHTS.hazardRisk_1s.w, x));
@@ -114,46 +404,84 @@ export function predictProba(xVecRaw){{
     return {{ hazardRisk: 0.15, miss3s: 0.08 }};
   }}
 }}
-"""
+""")
   os.makedirs(os.path.dirname(out_path), exist_ok=True)
   with open(out_path, "w", encoding="utf-8") as f:
     f.write(js)
 
 def main():
   ap = argparse.ArgumentParser()
-  ap.add_argument("--jsonl", required=True, help="path to mlrec_*.jsonl")
+  ap.add_argument("--jsonl", required=True, nargs="+", help="mlrec_*.jsonl files, globs, or directories")
   ap.add_argument("--out", default="herohealth/vr/goodjunk-model.js", help="export JS path (repo-relative)")
+  ap.add_argument("--cache-dir", default="tools/ml/.mlcache", help="per-file parsed feature cache (repo-relative)")
+  ap.add_argument("--no-cache", action="store_true", help="always reparse, do not read or write the cache")
+  ap.add_argument("--fold-std", action="store_true", help="export predictProba with mu/sd folded into the weights (allocation-free)")
   ap.add_argument("--steps", type=int, default=1400)
   ap.add_argument("--lr", type=float, default=0.08)
   ap.add_argument("--l2", type=float, default=0.02)
+  ap.add_argument("--solver", choices=["gd", "newton"], default="gd", help="newton = IRLS, a handful of iterations")
+  ap.add_argument("--tol", type=float, default=None, help="early stop (newton: step size, default 1e-7; gd: gradient, default off)")
+  ap.add_argument("--sweep", action="store_true", help="lr/l2/steps search in a process pool, scored on a held-out split; exports the winner")
+  ap.add_argument("--sweep-lr", default="0.02,0.05,0.08,0.15,0.3")
+  ap.add_argument("--sweep-l2", default="0.001,0.005,0.02,0.05,0.1")
+  ap.add_argument("--sweep-steps", default="400,800,1400,2000")
+  ap.add_argument("--sweep-random", type=int, default=0, help="N random log-uniform (lr, l2) draws within the --sweep-lr/--sweep-l2 range instead of the grid")
+  ap.add_argument("--holdout", type=float, default=0.2)
+  ap.add_argument("--seed", type=int, default=42)
+  ap.add_argument("--workers", type=int, default=None, help="processes for multi-file parsing and --sweep (default: all cores)")
   args = ap.parse_args()
 
-  rows = load_jsonl(args.jsonl)
-  if not rows:
-    raise SystemExit("No frame rows found in JSONL.")
+  paths = expand_jsonl_inputs(args.jsonl)
+  if not paths:
+    raise SystemExit(f"No JSONL files match: {' '.join(args.jsonl)}")
 
-  X, y1, y3 = to_xy(rows)
+  X, y1, y3 = load_xy(paths, workers=args.workers, cache_dir=None if args.no_cache else args.cache_dir)
+  if len(X) == 0:
+    raise SystemExit("No frame rows found in JSONL.")
+  print(f"Loaded {len(X)} labeled frames from {len(paths)} file(s)")
   if len(X) < 200:
     raise SystemExit(f"Too few samples: {len(X)} (need ~200+)")
 
+  if args.sweep:
+    rows = sweep(X, y1, y3, parse_floats(args.sweep_lr), parse_floats(args.sweep_l2),
+                 [int(s) for s in parse_floats(args.sweep_steps)], n_random=args.sweep_random,
+                 holdout=args.holdout, seed=args.seed, workers=args.workers)
+    print(f"{'rank':>4} {'lr':>8} {'l2':>8} {'steps':>6} {'val_loss':>9} {'hazard':>8} {'miss3':>8}")
+    for i, r in enumerate(rows[:15]):
+      print(f"{i+1:4d} {r['lr']:8.4f} {r['l2']:8.4f} {r['steps']:6d} {r['val_loss']:9.5f} {r['val_loss_hazard']:8.5f} {r['val_loss_miss3']:8.5f}")
+    table_path = os.path.splitext(args.out)[0] + ".sweep.csv"
+    write_sweep_csv(table_path, rows)
+    print("Sweep table:", table_path)
+    best = rows[0]
+    print(f"Best: lr={best['lr']:.4f} l2={best['l2']:.4f} steps={best['steps']} -> refit on all frames")
+    args.solver, args.lr, args.l2, args.steps, args.tol = "gd", best["lr"], best["l2"], best["steps"], None
+
   # Standardize
   mu, sd = standardize_fit(X)
   Xs = standardize_apply(X, mu, sd)
 
   # Train both heads
-  b1, w1 = train_logreg(Xs, y1, lr=args.lr, steps=args.steps, l2=args.l2)
-  b3, w3 = train_logreg(Xs, y3, lr=args.lr, steps=args.steps, l2=args.l2)
+  if args.solver == "newton":
+    tol = args.tol if args.tol is not None else 1e-7
+    b1, w1 = train_logreg_newton(Xs, y1, l2=args.l2, tol=tol)
+    b3, w3 = train_logreg_newton(Xs, y3, l2=args.l2, tol=tol)
+  else:
+    tol = args.tol or 0.0
+    b, W = train_logreg_multi(Xs, np.stack([y1, y3], axis=1), lr=args.lr, steps=args.steps, l2=args.l2, tol=tol)
+    b1, w1 = float(b[0]), W[:, 0].copy()
+    b3, w3 = float(b[1]), W[:, 1].copy()
 
   # Quick eval
   p1 = 1/(1+np.exp(-(Xs @ w1 + b1)))
   p3 = 1/(1+np.exp(-(Xs @ w3 + b3)))
-  acc1, bal1 = auc_like(y1, p1)
-  acc3, bal3 = auc_like(y3, p3)
-  print(f"[hazardRisk_1s] acc={acc1:.3f} bal={bal1:.3f} posRate={y1.mean():.3f}")
-  print(f"[miss_3s]      acc={acc3:.3f} bal={bal3:.3f} posRate={y3.mean():.3f}")
+  for name, yy, pp in (("[hazardRisk_1s]", y1, p1), ("[miss_3s]     ", y3, p3)):
+    m = eval_binary(yy, pp)
+    print(f"{name} acc={m['acc']:.3f} bal={m['bal']:.3f} posRate={m['pos_rate']:.3f} "
+          f"auc={m['auc']:.3f} prAuc={m['pr_auc']:.3f} logloss={m['logloss']:.4f} "
+          f"f1@0.5={m['f1_at_0.5']:.3f} f1Best={m['f1_best']:.3f}@{m['thr_best']:.3f}")
 
   # Export
-  export_js(args.out, mu, sd, b1, w1, b3, w3)
+  export_js(args.out, mu, sd, b1, w1, b3, w3, fold=args.fold_std)
   print("Exported:", args.out)
 
 if __name__ == "__main__":
@@ -14,13 +14,15 @@
 
 import argparse
 import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 from datetime import datetime, timezone
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.metrics import roc_auc_score, accuracy_score
 
 
@@ -44,6 +46,73 @@ def safe_num(s, default=0.0):
         pass
     return float(default)
 
+def finite_or_zero(s):
+    # vectorized safe_num(x, 0) for an already numeric column
+    v = np.asarray(s, dtype=np.float64)
+    return np.where(np.isfinite(v), v, 0.0)
+
+def _flag(x):
+    return 1 if str(x).strip().lower() in ["1","true","yes","on"] else (1 if safe_num(x,0) > 0 else 0)
+
+def coerce_flag(s: pd.Series):
+    # bossOn -> 0/1: the per-row rule evaluated once per distinct value
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    vals = np.array([_flag(u) for u in uniques] + [_flag(np.nan)], dtype=np.int64)
+    return pd.Series(vals[codes], index=s.index)
+
+def label_future_bad(ts, miss, hit, window_ms):
+    """
+    y[i] = 1 if a "bad" row k lies in (ts_i, ts_i + window_ms].
+    Row k is bad when its miss/hitJunk exceeds that of the first row whose
+    window reaches it (the row a forward two-pointer scan would compare it to):
+      s(k) = first i with ts_i + window_ms >= ts_k
+    ts must be sorted ascending.
+    """
+    n = len(ts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    scan = np.searchsorted(ts, ts - window_ms, side="left")
+    bad = (miss > miss[scan]) | (hit > hit[scan])
+    lo = np.searchsorted(ts, ts, side="right")              # first row strictly after ts_i
+    hi = np.searchsorted(ts, ts + window_ms, side="right")  # past the last row <= ts_i + window
+    cbad = np.concatenate([[0], np.cumsum(bad, dtype=np.int64)])
+    return (cbad[hi] - cbad[lo] > 0).astype(np.int64)
+
+SESSION_COLS = ["session_id", "sessionId"]
+
+def _label_shard(job):
+    # one contiguous run of whole sessions; bounds are (start, end) relative to the shard
+    ts, miss, hit, bounds, window_ms = job
+    y = np.zeros(len(ts), dtype=np.int64)
+    for a, b in bounds:
+        y[a:b] = label_future_bad(ts[a:b], miss[a:b], hit[a:b], window_ms)
+    return y
+
+def label_by_session(ts, miss, hit, sess, window_ms, workers=None):
+    """
+    label_future_bad within each session only (rows grouped by session, ts sorted
+    inside each group). Sessions are cut into contiguous shards of whole sessions
+    and labeled across a process pool.
+    """
+    n = len(ts)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    cuts = np.r_[0, np.flatnonzero(sess[1:] != sess[:-1]) + 1, n]
+    workers = workers or os.cpu_count() or 1
+    n_shards = min(len(cuts) - 1, workers * 4) if workers > 1 else 1
+    # shard edges at session starts, ~n / n_shards rows each
+    edges = np.unique(cuts[np.searchsorted(cuts, np.linspace(0, n, n_shards + 1), side="left")])
+    jobs = []
+    for a, b in zip(edges[:-1], edges[1:]):
+        c = cuts[(cuts >= a) & (cuts <= b)]
+        jobs.append((ts[a:b], miss[a:b], hit[a:b], list(zip(c[:-1] - a, c[1:] - a)), window_ms))
+    if len(jobs) > 1 and workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            parts = list(ex.map(_label_shard, jobs))
+    else:
+        parts = [_label_shard(j) for j in jobs]
+    return np.concatenate(parts)
+
 def parse_args():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True, help="CSV exported from Google Sheet (events-level or ticks-level)")
@@ -51,14 +120,21 @@ def parse_args():
     ap.add_argument("--test_size", type=float, default=0.2)
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--label_window_sec", type=float, default=3.0)
+    ap.add_argument("--session_col", default="auto",
+                    help="label each session separately: column name, auto (session_id/sessionId if present) or none")
+    ap.add_argument("--workers", type=int, default=None, help="processes for per-session labeling (default: all cores; --stream labels in-process)")
+    ap.add_argument("--stream", action="store_true",
+                    help="out-of-core: chunked read, running StandardScaler, SGD logistic partial_fit (CSV must be time-ordered)")
+    ap.add_argument("--chunksize", type=int, default=200000)
+    ap.add_argument("--passes", type=int, default=3, help="--stream SGD epochs over the CSV")
+    ap.add_argument("--alpha", type=float, default=1e-4, help="--stream SGD L2 strength")
     return ap.parse_args()
 
-def build_dataset(df: pd.DataFrame, label_window_sec: float):
+def prepare_frame(df: pd.DataFrame, ts_seed=None):
     """
-    Expect columns at least:
-      - ts_ms (or tsMs or timestamp ms)
-      - miss, hitJunk, accPct, medianRtGoodMs, combo, feverPct, timeLeftSec, bossOn
-    If your sheet uses other names, map them before calling.
+    Normalize timestamp + feature columns (copy).
+    ts_seed: last ts of the previous chunk, so a missing ts at the top of a chunk
+    forward-fills the same way as in a whole-file read.
     """
 
     # ---- normalize timestamp col ----
@@ -71,7 +147,11 @@ def build_dataset(df: pd.DataFrame, label_window_sec: float):
         raise ValueError("Missing timestamp column (ts_ms / tsMs / timestamp_ms etc.)")
 
     df = df.copy()
-    df["ts_ms"] = pd.to_numeric(df[ts_col], errors="coerce").fillna(method="ffill").fillna(0).astype(np.int64)
+    ts = pd.to_numeric(df[ts_col], errors="coerce")
+    if ts_seed is not None:
+        ts = pd.concat([pd.Series([ts_seed], dtype=np.float64), ts.astype(np.float64)], ignore_index=True).ffill().iloc[1:]
+        ts.index = df.index
+    df["ts_ms"] = ts.ffill().fillna(0).astype(np.int64)
 
     # ---- ensure feature cols exist ----
     for f in FEATURES:
@@ -81,77 +161,186 @@ def build_dataset(df: pd.DataFrame, label_window_sec: float):
     # ---- numeric cleanup ----
     for f in FEATURES:
         if f == "bossOn":
-            df[f] = df[f].apply(lambda x: 1 if str(x).strip().lower() in ["1","true","yes","on"] else (1 if safe_num(x,0) > 0 else 0))
+            df[f] = coerce_flag(df[f])
         else:
             df[f] = pd.to_numeric(df[f], errors="coerce").fillna(0.0)
+    return df
+
+def label_frame(df: pd.DataFrame, label_window_sec: float, session_col=None, workers=None):
+    # sort (by ts, then grouped by session) and label; returns (sorted df, y)
 
     # ---- label by future window (3s default) ----
     # We assume df is time-ordered (if not, sort)
+    if session_col is not None:
+        df["_sess"] = pd.factorize(df[session_col], use_na_sentinel=False)[0]
     df = df.sort_values("ts_ms").reset_index(drop=True)
+    if session_col is not None:
+        # stable: inside a session, rows keep the order of the global ts sort
+        df = df.sort_values("_sess", kind="stable").reset_index(drop=True)
 
-    # create future miss/hitJunk indicator within window
     window_ms = int(label_window_sec * 1000)
-    y = np.zeros(len(df), dtype=np.int64)
-
-    # two-pointer sweep
-    j = 0
-    future_bad = 0
-    # We'll compute for each i: whether any miss/hitJunk occurs in (ts_i, ts_i+window]
-    # Approach: for each i, move j to include future events, track if any bad exists in range.
-    # Simpler: brute force with rolling not perfect; we use pointer scan with queue of bad timestamps.
-    bad_ts = []
-
-    for i in range(len(df)):
-        t0 = int(df.loc[i, "ts_ms"])
-        # advance j to include up to t0 + window
-        t_end = t0 + window_ms
-        while j < len(df) and int(df.loc[j, "ts_ms"]) <= t_end:
-            # if row j is "bad" event tick
-            if (safe_num(df.loc[j, "miss"], 0) > safe_num(df.loc[i, "miss"], 0)) or (safe_num(df.loc[j, "hitJunk"], 0) > safe_num(df.loc[i, "hitJunk"], 0)):
-                bad_ts.append(int(df.loc[j, "ts_ms"]))
-            j += 1
-
-        # remove bad timestamps <= t0 (must be strictly future)
-        while bad_ts and bad_ts[0] <= t0:
-            bad_ts.pop(0)
-
-        y[i] = 1 if len(bad_ts) > 0 else 0
+    ts = df["ts_ms"].to_numpy(dtype=np.int64)
+    miss = finite_or_zero(df["miss"])
+    hit = finite_or_zero(df["hitJunk"])
+    if session_col is not None:
+        y = label_by_session(ts, miss, hit, df["_sess"].to_numpy(), window_ms, workers=workers)
+    else:
+        y = label_future_bad(ts, miss, hit, window_ms)
+    return df, y
+
+def build_dataset(df: pd.DataFrame, label_window_sec: float, session_col=None, workers=None):
+    """
+    Expect columns at least:
+      - ts_ms (or tsMs or timestamp ms)
+      - miss, hitJunk, accPct, medianRtGoodMs, combo, feverPct, timeLeftSec, bossOn
+    If your sheet uses other names, map them before calling.
+    session_col: optional session key; future windows then never cross sessions
+    (rows come back grouped by session, in first-seen order).
+    """
+    df = prepare_frame(df)
+    df, y = label_frame(df, label_window_sec, session_col=session_col, workers=workers)
 
     # build X
     X = df[FEATURES].to_numpy(dtype=np.float64)
     return X, y
 
+def iter_labeled_chunks(csv_path, label_window_sec, chunksize, session_col=None):
+    """
+    Stream (X, y) blocks from a time-ordered ticks CSV with bounded memory.
+    The largest ts loaded so far is the clock: a row is emitted once its whole
+    (ts, ts + window] future is behind the clock, and only rows within 2 windows of
+    the clock are carried into the next chunk (one window of lookahead for pending
+    rows, one of lookback for the "bad" comparison), however many sessions there are.
+    Chunks are small, so labeling runs in-process (no pool per chunk).
+    Labels match build_dataset when timestamps are unique within a session.
+    """
+    window_ms = int(label_window_sec * 1000)
+    carry = None
+    ts_seed = None
+    clock = None
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        if len(chunk) == 0:
+            continue
+        part = prepare_frame(chunk, ts_seed=ts_seed)
+        ts_seed = float(part["ts_ms"].iloc[-1])
+        part["_done"] = False
+        buf = part if carry is None else pd.concat([carry, part], ignore_index=True)
+        buf, y = label_frame(buf.drop(columns=["_sess"], errors="ignore"), label_window_sec,
+                             session_col=session_col, workers=1)
+        ts = buf["ts_ms"].to_numpy(dtype=np.int64)
+        clock = int(ts.max()) if clock is None else max(clock, int(ts.max()))
+        ready = ~buf["_done"].to_numpy() & (ts + window_ms < clock)
+        if ready.any():
+            yield buf.loc[ready, FEATURES].to_numpy(dtype=np.float64), y[ready]
+        buf["_done"] = buf["_done"].to_numpy() | ready
+        carry = buf.loc[ts >= clock - 2 * window_ms].reset_index(drop=True)
+    if carry is not None:
+        buf, y = label_frame(carry.drop(columns=["_sess"], errors="ignore"), label_window_sec,
+                             session_col=session_col, workers=1)
+        rest = ~buf["_done"].to_numpy()
+        if rest.any():
+            yield buf.loc[rest, FEATURES].to_numpy(dtype=np.float64), y[rest]
+
+def resolve_session_col(arg, columns):
+    if arg == "auto":
+        return next((c for c in SESSION_COLS if c in columns), None)
+    if arg == "none":
+        return None
+    if arg not in columns:
+        raise SystemExit(f"--session_col {arg!r} not in CSV columns")
+    return arg
+
+def train_stream(args):
+    """
+    Out-of-core fit: every pass re-reads the CSV through iter_labeled_chunks.
+      pass 0      StandardScaler.partial_fit on train rows
+      1..passes   SGDClassifier(log_loss).partial_fit, rows shuffled inside each chunk
+      last        predict the held-out rows for AUC/ACC
+    The test split is a per-row coin flip (test_size), reseeded each pass so every
+    pass sees the same split.
+    """
+    columns = pd.read_csv(args.csv, nrows=0).columns
+    session_col = resolve_session_col(args.session_col, columns)
+    if session_col:
+        print("Session key:", session_col)
+
+    def chunks():
+        rng = np.random.default_rng(args.seed)
+        for X, y in iter_labeled_chunks(args.csv, args.label_window_sec, args.chunksize,
+                                        session_col=session_col):
+            yield X, y, rng.random(len(y)) < args.test_size
+
+    scaler = StandardScaler()
+    n_train = n_test = n_pos = 0
+    for X, y, te in chunks():
+        if (~te).any():
+            scaler.partial_fit(X[~te])
+        n_train += int((~te).sum())
+        n_test += int(te.sum())
+        n_pos += int(y.sum())
+    if n_train == 0:
+        raise SystemExit("No training rows in CSV.")
+
+    clf = SGDClassifier(loss="log_loss", alpha=args.alpha, average=True, random_state=args.seed)
+    for ep in range(args.passes):
+        shuffle = np.random.default_rng(args.seed + 1 + ep)
+        for X, y, te in chunks():
+            tr = np.flatnonzero(~te)
+            if len(tr):
+                tr = tr[shuffle.permutation(len(tr))]
+                clf.partial_fit(scaler.transform(X[tr]), y[tr], classes=np.array([0, 1]))
+        print(f"pass {ep + 1}/{args.passes} done")
+
+    y_test, p_test = [], []
+    for X, y, te in chunks():
+        if te.any():
+            y_test.append(y[te])
+            p_test.append(clf.predict_proba(scaler.transform(X[te]))[:, 1])
+    y_test = np.concatenate(y_test) if y_test else np.zeros(0, dtype=np.int64)
+    p_test = np.concatenate(p_test) if p_test else np.zeros(0)
+    auc = float(roc_auc_score(y_test, p_test)) if len(np.unique(y_test)) > 1 else 0.5
+    acc = float(accuracy_score(y_test, (p_test >= 0.5).astype(np.int64))) if len(y_test) else 0.0
+    return clf, scaler, auc, acc, n_train, n_test, n_pos / max(n_train + n_test, 1)
+
 def main():
     args = parse_args()
-    df = pd.read_csv(args.csv)
+    if args.stream:
+        clf, scaler, auc, acc, n_train, n_test, pos_rate = train_stream(args)
+    else:
+        df = pd.read_csv(args.csv)
 
-    # If your CSV uses different names, map here:
-    # Example mapping:
-    # df.rename(columns={"medianRtGoodMs":"medianRtGoodMs"}, inplace=True)
+        # If your CSV uses different names, map here:
+        # Example mapping:
+        # df.rename(columns={"medianRtGoodMs":"medianRtGoodMs"}, inplace=True)
 
-    X, y = build_dataset(df, args.label_window_sec)
+        session_col = resolve_session_col(args.session_col, df.columns)
+        if session_col:
+            print("Session key:", session_col, "sessions:", int(df[session_col].nunique(dropna=False)))
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=args.test_size, random_state=args.seed, stratify=y if len(np.unique(y)) > 1 else None
-    )
+        X, y = build_dataset(df, args.label_window_sec, session_col=session_col, workers=args.workers)
 
-    scaler = StandardScaler()
-    X_train_z = scaler.fit_transform(X_train)
-    X_test_z  = scaler.transform(X_test)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=args.test_size, random_state=args.seed, stratify=y if len(np.unique(y)) > 1 else None
+        )
 
-    clf = LogisticRegression(
-        solver="lbfgs",
-        max_iter=200,
-        random_state=args.seed,
-    )
-    clf.fit(X_train_z, y_train)
+        scaler = StandardScaler()
+        X_train_z = scaler.fit_transform(X_train)
+        X_test_z  = scaler.transform(X_test)
 
-    # metrics
-    p_test = clf.predict_proba(X_test_z)[:, 1] if len(np.unique(y_test)) > 1 else np.full_like(y_test, 0.5, dtype=np.float64)
-    pred_test = (p_test >= 0.5).astype(np.int64)
+        clf = LogisticRegression(
+            solver="lbfgs",
+            max_iter=200,
+            random_state=args.seed,
+        )
+        clf.fit(X_train_z, y_train)
 
-    auc = float(roc_auc_score(y_test, p_test)) if len(np.unique(y_test)) > 1 else 0.5
-    acc = float(accuracy_score(y_test, pred_test))
+        # metrics
+        p_test = clf.predict_proba(X_test_z)[:, 1] if len(np.unique(y_test)) > 1 else np.full_like(y_test, 0.5, dtype=np.float64)
+        pred_test = (p_test >= 0.5).astype(np.int64)
+
+        auc = float(roc_auc_score(y_test, p_test)) if len(np.unique(y_test)) > 1 else 0.5
+        acc = float(accuracy_score(y_test, pred_test))
+        n_train, n_test, pos_rate = len(X_train), len(X_test), float(np.mean(y))
 
     # export
     out = {
@@ -169,9 +358,9 @@ def main():
             "auc": auc,
             "acc": acc,
             "label_window_sec": float(args.label_window_sec),
-            "n_train": int(len(X_train)),
-            "n_test": int(len(X_test)),
-            "pos_rate": float(np.mean(y)),
+            "n_train": int(n_train),
+            "n_test": int(n_test),
+            "pos_rate": float(pos_rate),
         }
     }
 
@@ -179,7 +368,7 @@ def main():
         json.dump(out, f, ensure_ascii=False, indent=2)
 
     print("✅ Exported:", args.out)
-    print("AUC:", auc, "ACC:", acc, "pos_rate:", float(np.mean(y)))
+    print("AUC:", auc, "ACC:", acc, "pos_rate:", float(pos_rate))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file